@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import joblib
+from benchmarks.synthetic_corpus import generate_corpus
+from src.data_processing import load_audio_files_with_metadata
+from src.feature_extraction import extract_basic_features, extract_mfcc
+from src.model_training import prepare_data_for_training, train_action_prediction_model, train_model
+from src.inference import run_inference
+
+def measure(fn, *args, **kwargs):
+    """Runs ``fn`` and returns (result, wall seconds, peak traced bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+def run_benchmarks(corpus_dir, n_jobs=1, with_ensemble=False, verbose=True):
+    """Times every pipeline stage on a corpus.
+
+    Args:
+        corpus_dir (str): Directory of ``.wav`` files with JSON metadata.
+        n_jobs (int): Number of decoding processes for the loading stage.
+        with_ensemble (bool): Also benchmark the full ``train_model`` ensemble (needs TensorFlow).
+        verbose (bool): Print each stage's timing as it completes.
+
+    Returns:
+        dict: Stage name to {"seconds", "peak_bytes", "tracks_per_second", "audio_seconds_per_second"}.
+    """
+    stages = {}
+
+    def record(name, fn, *args, **kwargs):
+        result, seconds, peak = measure(fn, *args, **kwargs)
+        stages[name] = {"seconds": seconds, "peak_bytes": peak}
+        if verbose:
+            print(f"{name:>12}: {seconds:8.3f} s  peak {peak / 2 ** 20:8.1f} MiB")
+        return result
+
+    audio_data = record("load", load_audio_files_with_metadata, corpus_dir, n_jobs=n_jobs)
+    features = record("features", extract_basic_features, audio_data, cache=False)
+
+    def train():
+        X, y = prepare_data_for_training(features, audio_data)
+        labels = [effects[0]["effect"] for effects in y]
+        return train_action_prediction_model(X, labels)
+
+    model = record("train", train)
+    if with_ensemble:
+        mfcc = extract_mfcc(audio_data, cache=False)
+        labels = {filename: track.metadata["effects"][0]["effect"] for filename, track in audio_data.items()}
+        record("train_model", train_model, mfcc, labels)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.pkl")
+        joblib.dump(model, model_path)
+        record("inference", run_inference, model_path, audio_data)
+
+    n_tracks = len(audio_data)
+    audio_seconds = sum(track.duration for track in audio_data.values())
+    for stage in stages.values():
+        stage["tracks_per_second"] = n_tracks / stage["seconds"]
+        stage["audio_seconds_per_second"] = audio_seconds / stage["seconds"]
+    return stages
+
+def find_regressions(stages, baseline, tolerance):
+    """Lists stages whose time or peak memory exceeds the baseline by more than ``tolerance``."""
+    regressions = []
+    for name, result in stages.items():
+        reference = baseline.get("stages", {}).get(name)
+        if reference is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {result[metric]:.4g} > baseline {reference[metric]:.4g}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic corpus.")
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Track length in seconds")
+    parser.add_argument("--sr", type=int, default=22050)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--n-jobs", type=int, default=1, help="Decoding processes for the load stage")
+    parser.add_argument("--ensemble", action="store_true", help="Also benchmark train_model (needs TensorFlow)")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    config = {"tracks": args.tracks, "duration": args.duration, "sr": args.sr,
+              "seed": args.seed, "n_jobs": args.n_jobs}
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        # Warm up lazy imports and JIT caches so they do not count against the first stage
+        warmup_dir = os.path.join(corpus_dir, "warmup")
+        generate_corpus(warmup_dir, 2, 1.0, args.sr, args.seed)
+        run_benchmarks(warmup_dir, n_jobs=args.n_jobs, with_ensemble=args.ensemble, verbose=False)
+
+        generate_corpus(corpus_dir, args.tracks, args.duration, args.sr, args.seed)
+        stages = run_benchmarks(corpus_dir, n_jobs=args.n_jobs, with_ensemble=args.ensemble)
+
+    results = {
+        "config": config,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "stages": stages,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print("Baseline was recorded with a different configuration; skipping comparison")
+        return
+    regressions = find_regressions(stages, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,76 @@
+import argparse
 import os
-from src.data_processing import load_audio_files_with_metadata
-from src.feature_extraction import extract_basic_features
-from src.model_training import prepare_data_for_training, train_model, incorporate_feedback_into_training
+from src.data_processing import AudioCatalog
+from src.feature_store import FeatureStore
+from src.feature_cache import configure_cache
+from src.model_training import prepare_data_for_training, train_model
 from src.action_suggestion import print_suggested_actions
-from src.feedback import collect_user_feedback, save_feedback
-from inference import run_inference, load_model
+from src.feedback import collect_user_feedback, save_feedback, incorporate_feedback_into_training
+from src.manifest import process_new_audio
+from src.model_export import export_model
+from src import profiling
+from src.profiling import span
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train, suggest and learn from feedback.")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Record per-stage timings and memory, writing profile_summary.json "
+                             "and profile_trace.json (Chrome trace format) to DIR. "
+                             "Setting MASTERIA_PROFILE=1 enables the same instrumentation.")
+    parser.add_argument("--model-version", metavar="VERSION",
+                        help="Key the stored suggestions for data/new_audio/ on VERSION so unchanged "
+                             "files are not re-analysed after retraining. By default every run "
+                             "retrains, so every file is analysed again.")
+    return parser.parse_args()
 
 def main():
-    # Step 1: Load the data for initial training
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+    try:
+        run_pipeline(args.model_version)
+    finally:
+        if profiling.is_enabled():
+            profile_dir = args.profile or "."
+            os.makedirs(profile_dir, exist_ok=True)
+            profiling.write_summary(os.path.join(profile_dir, "profile_summary.json"))
+            profiling.write_chrome_trace(os.path.join(profile_dir, "profile_trace.json"))
+
+def run_pipeline(model_version=None):
+    # Reuse features of unchanged tracks across runs
+    configure_cache("data/processed/features")
+
+    # Step 1: Index the data for initial training. Audio is decoded on access
+    # within a fixed memory budget; the catalog also serves the metadata.
     data_directory = "data/audio_with_metadata/"
-    audio_data, metadata = load_audio_files_with_metadata(data_directory)
+    with span("stage.load"):
+        audio_data = AudioCatalog(data_directory, require_metadata=True)
+        metadata = audio_data
 
-    # Step 2: Extract features
-    features = extract_basic_features(audio_data)
+    # Step 2: Extract features into the library-wide columnar store; tracks
+    # whose file is unchanged since their row was extracted are skipped
+    with span("stage.features"):
+        features = FeatureStore("data/processed/feature_store")
+        features.update_from_audio(audio_data)
 
     # Step 3: Prepare data and train the model
-    X, y = prepare_data_for_training(features, metadata)
-    model = train_model(X, y)  # Initial training
+    with span("stage.train"):
+        X, y = prepare_data_for_training(features, metadata)
+        model = train_model(X, y)  # Initial training
     
     # Save the model for later inference
     model_path = "models/trained_model.pkl"
     model.save_model(model_path)
+    export_model(model, "models/trained_model_compact")
 
-    # Step 4: Use the model to suggest actions on new audio data through inference
+    # Step 4: Use the model to suggest actions on new audio data through inference.
+    # The ingestion manifest keys stored suggestions on the model version. Step 3
+    # retrains on every run, so without --model-version every file is analysed
+    # again; with it, only new or changed files are.
     new_data_directory = "data/new_audio/"
-    new_audio_data, _ = load_audio_files_with_metadata(new_data_directory)
-
-    # Load the model for inference
-    inference_model = load_model(model_path)
-    
-    # Run inference to get suggested actions and cuts
-    suggested_actions, suggested_cuts = run_inference(model_path, new_audio_data)
+    with span("stage.inference"):
+        suggested_actions, suggested_cuts, _ = process_new_audio(new_data_directory, model_path,
+                                                                 version=model_version)
 
     # Print the suggested actions and cuts
     print_suggested_actions(suggested_actions, suggested_cuts)
@@ -39,8 +79,11 @@ def main():
     feedback = collect_user_feedback(suggested_actions, suggested_cuts)
     save_feedback(feedback)
 
-    # Step 6: Retrain the model using the feedback
-    model = incorporate_feedback_into_training(features, metadata)
+    # Step 6: Update the trained model from the feedback; a full retraining
+    # only runs when the adjusted labels drift too far (see ``update_model``)
+    with span("stage.retrain"):
+        labels = dict(zip([f for f in features.filenames if f in metadata], y))
+        model = incorporate_feedback_into_training(features, labels, model=model)
     model.save_model(model_path)
 
 if __name__ == "__main__":
@@ -1,36 +1,167 @@
-def suggest_actions(model, features):
+import numpy as np
+import librosa
+from src.data_processing import track_audio
+from src.feature_extraction import compute_features, summarize_basic_features
+from src.feature_store import FeatureStore
+
+def feature_matrix(features):
+    """Stacks per-track feature dictionaries into one matrix.
+
+    A ``FeatureStore`` is returned as is (its rows are already a matrix).
+    For dictionaries, columns follow the feature names of the first track,
+    looked up by name for every other track.
+
+    Args:
+        features (dict): Extracted features where keys are filenames, or a ``FeatureStore``.
+
+    Returns:
+        tuple: (filenames, X) with one row of X per filename.
+    """
+    if isinstance(features, FeatureStore):
+        return list(features.filenames), features.matrix()
+    filenames = list(features)
+    columns = list(features[filenames[0]]) if filenames else []
+    X = np.array([[features[filename][name] for name in columns] for filename in filenames], dtype=float)
+    return filenames, X
+
+def predict_in_batches(model, X, batch_size=1024, method="predict"):
+    """Runs a model over the rows of X in batches of at most ``batch_size``.
+
+    Args:
+        model: Trained model.
+        X (np.ndarray): Feature matrix.
+        batch_size (int): Maximum number of rows per model call.
+        method (str): Name of the model method to call (e.g. "predict_proba").
+
+    Returns:
+        np.ndarray: Concatenated model outputs, one per row of X.
+    """
+    predict = getattr(model, method)
+    outputs = [predict(X[start:start + batch_size]) for start in range(0, len(X), batch_size)]
+    return np.concatenate(outputs) if outputs else np.empty(0)
+
+def first_stage_model(model, name="rf"):
+    """Returns the cheap first-stage member of an ensemble, or None.
+
+    Works with fitted scikit-learn ``VotingClassifier`` ensembles and with
+    exported ``CompactModel`` directories. The member's probability columns
+    follow ``model.classes_``.
+
+    Args:
+        model: Trained ensemble.
+        name (str): Name of the member to use as the first stage.
+
+    Returns:
+        The first-stage estimator, or None if the model has no such member.
+    """
+    if hasattr(model, "member"):  # CompactModel
+        return model.member(name) if name in model.member_names else None
+    named = getattr(model, "named_estimators_", None)
+    if named is not None and name in named:
+        return named[name]
+    return None
+
+def cascade_predict(model, X, threshold=0.9, batch_size=1024, first_stage=None, audit=False):
+    """Predicts with a fast first stage, escalating unsure rows to the full model.
+
+    The first stage scores every row in batches. Rows whose highest class
+    probability is below ``threshold`` are predicted again by ``model``.
+
+    Args:
+        model: Trained model (the full ensemble).
+        X (np.ndarray): Feature matrix.
+        threshold (float): Minimum first-stage confidence to skip escalation.
+        batch_size (int): Maximum number of rows per model call.
+        first_stage: Model with ``predict_proba``; defaults to ``first_stage_model(model)``.
+        audit (bool): Also run the full model on every row and report agreement.
+
+    Returns:
+        tuple: (predictions, stats) where stats holds ``n_tracks``,
+        ``n_escalated`` and ``escalation_rate``, plus ``agreement`` (cascade
+        vs. full model) and ``first_stage_agreement`` (on non-escalated rows)
+        when auditing.
+    """
+    if first_stage is None:
+        first_stage = first_stage_model(model)
+        if first_stage is None:
+            raise ValueError("Model has no first-stage member; pass first_stage explicitly")
+    classes = np.asarray(model.classes_)
+    if len(X) == 0:
+        return classes[:0], {"n_tracks": 0, "n_escalated": 0, "escalation_rate": 0.0}
+
+    proba = predict_in_batches(first_stage, X, batch_size, method="predict_proba")
+    predictions = classes[np.argmax(proba, axis=1)]
+    escalate = proba.max(axis=1) < threshold
+    if escalate.any():
+        predictions[escalate] = predict_in_batches(model, X[escalate], batch_size)
+
+    stats = {
+        "n_tracks": len(X),
+        "n_escalated": int(escalate.sum()),
+        "escalation_rate": float(escalate.mean()),
+    }
+    if audit:
+        full = predict_in_batches(model, X, batch_size)
+        stats["agreement"] = float(np.mean(full == predictions))
+        kept = ~escalate
+        stats["first_stage_agreement"] = float(np.mean(full[kept] == predictions[kept])) if kept.any() else 1.0
+    return predictions, stats
+
+def predict_labels(model, X, batch_size=1024, cascade_threshold=None, cascade_stats=None, cascade_audit=False):
+    """Predicts one label per row of X, optionally through a confidence cascade.
+
+    Args:
+        model: Trained model.
+        X (np.ndarray): Feature matrix.
+        batch_size (int): Maximum number of rows per model call.
+        cascade_threshold (float): Enable ``cascade_predict`` with this threshold.
+        cascade_stats (dict): Updated in place with the cascade metrics.
+        cascade_audit (bool): Compare the cascade against the full model.
+
+    Returns:
+        np.ndarray: Predictions, one per row of X.
+    """
+    if cascade_threshold is None:
+        return predict_in_batches(model, X, batch_size)
+    predictions, stats = cascade_predict(model, X, cascade_threshold, batch_size, audit=cascade_audit)
+    if cascade_stats is not None:
+        cascade_stats.update(stats)
+    return predictions
+
+def suggest_actions(model, features, batch_size=1024, cascade_threshold=None, cascade_stats=None):
     """Suggests actions based on model predictions.
 
     Args:
         model: Trained model.
-        features: Extracted features from new audio.
+        features: Extracted features from new audio (a dict or ``FeatureStore``).
+        batch_size (int): Maximum number of tracks per model call.
+        cascade_threshold (float): Only escalate tracks the first stage is less sure of.
+        cascade_stats (dict): Updated in place with the cascade metrics.
 
     Returns:
         dict: Suggested actions for each track.
     """
-    actions = {}
-    for filename, feature_values in features.items():
-        prediction = model.predict([list(feature_values.values())])
-        actions[filename] = prediction[0]  # Assuming the prediction is a list of actions
-    return actions
-    
-def suggest_cuts(model, features):
-    """Suggests creative cuts or glitches in the beats.
+    filenames, X = feature_matrix(features)
+    predictions = predict_labels(model, X, batch_size, cascade_threshold, cascade_stats)
+    # Assuming each prediction is a list of actions
+    return dict(zip(filenames, predictions))
+
+def cuts_from_predictions(filenames, predictions):
+    """Turns per-track predictions into suggested cuts.
 
     Args:
-        model: Trained machine learning model.
-        features (dict): Extracted features from new audio tracks.
+        filenames (list): Track names.
+        predictions: Model predictions, one per track.
 
     Returns:
         dict: Suggested cuts or modifications.
     """
     cuts = {}
-    for track_name, track_features in features.items():
+    for track_name, prediction in zip(filenames, predictions):
         cuts[track_name] = []
-        prediction = model.predict(track_features.T)
-        
+
         # Example of suggesting cuts based on prediction
-        if prediction == 1:  # Assuming 1 means take creative liberty
+        if np.all(prediction == 1):  # Assuming 1 means take creative liberty
             cuts[track_name].append({
                 'action': 'Cut',
                 'location': 'Chorus Start',
@@ -44,6 +175,208 @@ def suggest_cuts(model, features):
 
     return cuts
 
+def suggest_cuts(model, features, batch_size=1024, cascade_threshold=None, cascade_stats=None):
+    """Suggests creative cuts or glitches in the beats.
+
+    Args:
+        model: Trained machine learning model.
+        features (dict): Extracted features from new audio tracks.
+        batch_size (int): Maximum number of tracks per model call.
+        cascade_threshold (float): Only escalate tracks the first stage is less sure of.
+        cascade_stats (dict): Updated in place with the cascade metrics.
+
+    Returns:
+        dict: Suggested cuts or modifications.
+    """
+    filenames, X = feature_matrix(features)
+    predictions = predict_labels(model, X, batch_size, cascade_threshold, cascade_stats)
+    return cuts_from_predictions(filenames, predictions)
+
+CUT_EFFECTS = {
+    'Cut': 'Introduce a glitch effect',
+    'Slice': 'Add a stutter effect',
+}
+
+def cut_candidates(audio, sr, window_beats=4, hop_beats=1, hop_length=512, default_bpm=120.0):
+    """Computes the beat-aligned windows of a track that cuts may target.
+
+    Frame features and the onset envelope come from one shared STFT. The
+    windows span ``window_beats`` beats and start every ``hop_beats`` beats.
+    Each window is summarised like ``extract_basic_features`` summarises a
+    whole track: mean spectral centroid, RMS energy and bandwidth ("loudness").
+    A cumulative sum gives every window mean without a Python loop. Tracks
+    with too few detected beats fall back to a ``default_bpm`` grid. The
+    whole-track summary is returned too, so callers that also need the
+    track's action row do not run a second STFT.
+
+    Args:
+        audio (np.ndarray): 1-D audio signal.
+        sr (int): Sample rate.
+        window_beats (int): Window length in beats.
+        hop_beats (int): Beats between consecutive window starts.
+        hop_length (int): Number of samples between frames.
+        default_bpm (float): Tempo of the fallback grid.
+
+    Returns:
+        dict: ``X`` (windows x 3 features), ``start`` and ``end`` times in
+        seconds, and ``busy`` (whether a window's onset strength is above the
+        track's median, i.e. a percussive passage suited to a stutter), and
+        ``features``, the track's ``extract_basic_features`` summary.
+    """
+    frames = compute_features(audio, sr, include=("spectral_centroid", "rmse", "spectral_bandwidth", "mel"),
+                              hop_length=hop_length)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(frames["mel"], ref=np.max), sr=sr)
+    _, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
+    n_frames = frames["rmse"].shape[-1]
+    if len(beats) < window_beats + 1:
+        beats = np.arange(0, n_frames, max(1, int(round(60.0 / default_bpm * sr / hop_length))))
+    bounds = np.append(np.asarray(beats, dtype=int), n_frames)
+    starts = bounds[0:max(len(bounds) - window_beats, 0):hop_beats]
+    ends = bounds[window_beats::hop_beats][:len(starts)]
+    if len(starts) == 0:  # Shorter than one window: score the whole track
+        starts, ends = np.array([0]), np.array([n_frames])
+    ends = np.maximum(ends, starts + 1)
+
+    series = [frames["spectral_centroid"][0], frames["rmse"][0], frames["spectral_bandwidth"][0],
+              onset_env[:n_frames]]
+    sums = np.cumsum(np.pad(np.vstack(series).astype(np.float64), ((0, 0), (1, 0))), axis=1)
+    means = (sums[:, ends] - sums[:, starts]) / (ends - starts)
+    frame_times = librosa.frames_to_time(np.arange(n_frames + 1), sr=sr, hop_length=hop_length)
+    return {
+        "X": means[:3].T,
+        "start": frame_times[starts],
+        "end": np.minimum(frame_times[ends], len(audio) / sr),
+        "busy": means[3] > np.median(onset_env),
+        "features": summarize_basic_features(frames),
+    }
+
+def _positive_scores(model, X, batch_size=1024, positive_class=1, cascade_threshold=None):
+    """Probability of ``positive_class`` per row (0/1 predictions for models without probabilities).
+
+    With ``cascade_threshold`` set, rows are scored by the first stage (see
+    ``cascade_predict``) and only rows it is less sure of by the full model.
+    """
+    if len(X) == 0:
+        return np.empty(0)
+    if not hasattr(model, "predict_proba"):
+        return (predict_in_batches(model, X, batch_size) == positive_class).astype(float)
+    column = np.flatnonzero(np.asarray(model.classes_) == positive_class)
+    if len(column) == 0:
+        return np.zeros(len(X))
+    first_stage = first_stage_model(model) if cascade_threshold is not None else None
+    if first_stage is None:
+        return predict_in_batches(model, X, batch_size, method="predict_proba")[:, column[0]]
+    proba = predict_in_batches(first_stage, X, batch_size, method="predict_proba")
+    escalate = proba.max(axis=1) < cascade_threshold
+    if escalate.any():
+        proba[escalate] = predict_in_batches(model, X[escalate], batch_size, method="predict_proba")
+    return proba[:, column[0]]
+
+def _format_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+def rank_cuts(candidates, scores, top_k=5, min_score=0.5):
+    """Picks the best-scoring, non-overlapping windows of one track as cut suggestions.
+
+    Args:
+        candidates (dict): Output of ``cut_candidates``.
+        scores (np.ndarray): Model score of each candidate window.
+        top_k (int): Maximum number of suggestions.
+        min_score (float): Minimum score for a window to be suggested.
+
+    Returns:
+        list: Suggestions ordered by descending score, each with action,
+        location, description, time (start in seconds) and score.
+    """
+    cuts = []
+    taken = []
+    for i in np.argsort(-scores, kind="stable"):
+        if len(cuts) >= top_k or scores[i] < min_score:
+            break
+        start, end = candidates["start"][i], candidates["end"][i]
+        if any(start < t_end and t_start < end for t_start, t_end in taken):
+            continue
+        taken.append((start, end))
+        action = 'Slice' if candidates["busy"][i] else 'Cut'
+        cuts.append({
+            'action': action,
+            'location': f"{_format_time(start)}-{_format_time(end)}",
+            'description': CUT_EFFECTS[action],
+            'time': float(start),
+            'score': float(scores[i]),
+        })
+    return cuts
+
+def timed_cuts_from_candidates(model, candidates, batch_size=1024, top_k=5, min_score=0.5,
+                               cascade_threshold=None):
+    """Scores the candidate windows of many tracks in one batched model call.
+
+    Args:
+        model: Trained model.
+        candidates (dict): Filename to ``cut_candidates`` output.
+        batch_size (int): Maximum number of windows per model call.
+        top_k (int): Maximum number of suggestions per track.
+        min_score (float): Minimum score for a window to be suggested.
+        cascade_threshold (float): Score windows through the first stage, escalating
+            only those it is less sure of (see ``cascade_predict``).
+
+    Returns:
+        dict: Filename to ranked, timestamped cut suggestions.
+    """
+    filenames = list(candidates)
+    if not filenames:
+        return {}
+    X = np.vstack([candidates[f]["X"] for f in filenames])
+    offsets = np.cumsum([0] + [len(candidates[f]["X"]) for f in filenames])
+    scores = _positive_scores(model, X, batch_size, cascade_threshold=cascade_threshold)
+    return {filename: rank_cuts(candidates[filename], scores[offsets[i]:offsets[i + 1]], top_k, min_score)
+            for i, filename in enumerate(filenames)}
+
+def suggest_timed_cuts(model, audio_data, sr=None, batch_size=1024, top_k=5, min_score=0.5,
+                       cascade_threshold=None, **kwargs):
+    """Suggests cuts and slices at concrete, beat-aligned positions of each track.
+
+    Every beat-aligned window of every track is scored by the model, with
+    all windows in one batched call. Windows far outnumber tracks, so with
+    ``cascade_threshold`` set they go through the same cascade as the
+    whole-track predictions. The best non-overlapping windows are
+    returned per track. Windows in percussive passages are suggested as a
+    stutter ("Slice") and the rest as a glitch ("Cut").
+
+    Args:
+        model: Trained model (scores windows by the probability of class 1).
+        audio_data (dict): ``Track`` records (or raw audio arrays with ``sr``).
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
+        batch_size (int): Maximum number of windows per model call.
+        top_k (int): Maximum number of suggestions per track.
+        min_score (float): Minimum score for a window to be suggested.
+        cascade_threshold (float): Enable cascade scoring (see ``timed_cuts_from_candidates``).
+        **kwargs: Window parameters forwarded to ``cut_candidates``.
+
+    Returns:
+        dict: Filename to suggestions ordered by descending score.
+    """
+    candidates = track_cut_candidates(audio_data, sr, **kwargs)
+    return timed_cuts_from_candidates(model, candidates, batch_size, top_k, min_score, cascade_threshold)
+
+def track_cut_candidates(audio_data, sr=None, **kwargs):
+    """Computes ``cut_candidates`` for every track.
+
+    Args:
+        audio_data (dict): ``Track`` records (or raw audio arrays with ``sr``).
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
+        **kwargs: Window parameters forwarded to ``cut_candidates``.
+
+    Returns:
+        dict: Filename to ``cut_candidates`` output.
+    """
+    candidates = {}
+    for filename, track in audio_data.items():
+        audio, track_sr = track_audio(filename, track, sr)
+        candidates[filename] = cut_candidates(audio, track_sr, **kwargs)
+    return candidates
+
 def print_suggested_actions(actions):
     """Prints out the suggested actions for each track.
 
@@ -0,0 +1,210 @@
+# batch_inference.py
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+
+_SHARD_FILE = "shard-{index:05d}-of-{count:05d}.jsonl"
+_SHARD_PATTERN = re.compile(r"shard-(\d{5})-of-(\d{5})\.jsonl$")
+
+def shard_of(filename, shard_count):
+    """Returns the shard a file belongs to.
+
+    The shard depends only on the file's name relative to the catalog
+    directory, so every machine agrees regardless of where the shared
+    filesystem is mounted.
+
+    Args:
+        filename (str): Path of the file relative to the catalog directory.
+        shard_count (int): Total number of shards.
+
+    Returns:
+        int: Shard index in ``range(shard_count)``.
+    """
+    digest = hashlib.sha1(filename.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+def shard_files(directory, shard_index, shard_count):
+    """Lists the ``.wav`` files of a directory that belong to one shard."""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is outside 0..{shard_count - 1}")
+    return sorted(f for f in os.listdir(directory)
+                  if f.endswith('.wav') and shard_of(f, shard_count) == shard_index)
+
+def shard_path(output_dir, shard_index, shard_count):
+    """Returns the results file of one shard."""
+    return os.path.join(output_dir, _SHARD_FILE.format(index=shard_index, count=shard_count))
+
+def _done_path(path):
+    """Returns the completion marker written next to a shard file once the shard has finished."""
+    return path + ".done"
+
+def _read_shard(path, truncate=False):
+    """Reads the complete records of a shard file, ignoring a torn final line.
+
+    Args:
+        path (str): Shard file.
+        truncate (bool): Cut the torn line from the file. Only the shard's own
+            runner may do this, right before it appends; a reader could
+            otherwise cut a line that is still being written.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'rb+' if truncate else 'rb') as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if truncate and end != len(data):
+            # The previous run died mid-write; cut the partial record so appends stay valid
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        if line.strip():
+            records.append(json.loads(line))
+    return records
+
+def run_shard(directory, model_path, output_dir, shard_index, shard_count, n_decoders=1, n_extractors=2,
+              batch_size=32, cascade_threshold=None):
+    """Processes one shard of a catalog, appending results to the shard's JSONL file.
+
+    Files already present in the shard file are skipped, so a rerun after a
+    crash or preemption resumes where it stopped. Only the shard's own file
+    is written, so shards can run on different machines over a shared
+    filesystem without any coordination. Once every file is written, a
+    ``.done`` marker holding the record count is put next to the shard file;
+    ``merge_shards`` refuses shards without it.
+
+    Args:
+        directory (str): Catalog directory of ``.wav`` files.
+        model_path (str): Path to the pre-trained model file or compact model directory.
+        output_dir (str): Directory holding the per-shard results files.
+        shard_index (int): Index of the shard to process.
+        shard_count (int): Total number of shards.
+        n_decoders (int): Number of decoding processes.
+        n_extractors (int): Number of feature extraction threads.
+        batch_size (int): Maximum tracks per model call.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
+
+    Returns:
+        tuple: (processed, skipped) file counts.
+    """
+    from src.inference import get_model, to_jsonable
+    from src.pipeline import iter_pipelined
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = shard_path(output_dir, shard_index, shard_count)
+    marker = _done_path(path)
+    if os.path.exists(marker):
+        os.remove(marker)  # Until this run finishes, the shard is incomplete again
+    done = {record["filename"] for record in _read_shard(path, truncate=True)}
+    todo = [f for f in shard_files(directory, shard_index, shard_count) if f not in done]
+
+    processed = 0
+    with open(path, 'a') as out:
+        if todo:
+            stream = iter_pipelined(directory, get_model(model_path), n_decoders=n_decoders,
+                                    n_extractors=n_extractors, batch_size=batch_size,
+                                    cascade_threshold=cascade_threshold, filenames=todo)
+            for filename, action, cuts in stream:
+                out.write(json.dumps(to_jsonable({"filename": filename, "action": action, "cuts": cuts})) + "\n")
+                out.flush()
+                processed += 1
+        os.fsync(out.fileno())
+    tmp = f"{marker}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"done": True, "count": len(done) + processed}, f)
+    os.replace(tmp, marker)
+    return processed, len(done)
+
+def merge_shards(output_dir, shard_count=None):
+    """Combines per-shard results into the final suggestions.
+
+    Args:
+        output_dir (str): Directory holding the per-shard results files.
+        shard_count (int): Expected number of shards; inferred from the file names if None.
+
+    Returns:
+        tuple: (actions, cuts) dictionaries keyed by filename, as from ``run_inference``.
+
+    Raises:
+        ValueError: If shard files of different shard counts are mixed, or a
+            shard is missing or has not finished (no ``.done`` marker, or fewer
+            records than the marker counts).
+    """
+    shards = {}
+    for path in glob.glob(os.path.join(output_dir, "shard-*-of-*.jsonl")):
+        match = _SHARD_PATTERN.search(os.path.basename(path))
+        if match:
+            shards[int(match.group(1))] = (int(match.group(2)), path)
+    counts = {count for count, _ in shards.values()}
+    if len(counts) > 1:
+        raise ValueError(f"Shard files in {output_dir} mix shard counts {sorted(counts)}")
+    if shard_count is None:
+        shard_count = counts.pop() if counts else 0
+    missing = sorted(set(range(shard_count)) - set(shards))
+    if missing:
+        raise ValueError(f"Missing results for shards {missing} of {shard_count}")
+
+    records, unfinished = {}, []
+    for index in sorted(shards):
+        path = shards[index][1]
+        records[index] = _read_shard(path)
+        try:
+            with open(_done_path(path)) as f:
+                count = json.load(f)["count"]
+        except (OSError, ValueError, KeyError):
+            count = None
+        if count is None or len(records[index]) < count:
+            unfinished.append(index)
+    if unfinished:
+        raise ValueError(f"Shards {unfinished} of {shard_count} have not finished")
+
+    actions, cuts = {}, {}
+    for index in sorted(records):
+        for record in records[index]:
+            actions[record["filename"]] = record["action"]
+            cuts[record["filename"]] = record["cuts"]
+    return ({f: actions[f] for f in sorted(actions)}, {f: cuts[f] for f in sorted(cuts)})
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded batch inference over a shared filesystem.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Process one shard of a catalog")
+    run.add_argument("model_path", help="Path to the pre-trained model file or compact model directory")
+    run.add_argument("audio_dir", help="Catalog directory of .wav files")
+    run.add_argument("output_dir", help="Directory for the per-shard results files")
+    run.add_argument("--shard-index", type=int, required=True)
+    run.add_argument("--shard-count", type=int, required=True)
+    run.add_argument("--decoders", type=int, default=1, help="Number of decoding processes")
+    run.add_argument("--extractors", type=int, default=2, help="Number of feature extraction threads")
+    run.add_argument("--batch-size", type=int, default=32, help="Maximum tracks per model call")
+    run.add_argument("--cascade-threshold", type=float,
+                     help="Only send tracks below this random-forest confidence to the full ensemble")
+
+    merge = commands.add_parser("merge", help="Combine shard results into one suggestions file")
+    merge.add_argument("output_dir", help="Directory holding the per-shard results files")
+    merge.add_argument("--shard-count", type=int, help="Expected number of shards")
+    merge.add_argument("--output", help="Write the merged suggestions here instead of stdout")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        processed, skipped = run_shard(args.audio_dir, args.model_path, args.output_dir, args.shard_index,
+                                       args.shard_count, args.decoders, args.extractors, args.batch_size,
+                                       args.cascade_threshold)
+        print(f"shard {args.shard_index}/{args.shard_count}: {processed} processed, "
+              f"{skipped} already done", file=sys.stderr)
+        return
+
+    actions, cuts = merge_shards(args.output_dir, args.shard_count)
+    results = {"actions": actions, "cuts": cuts}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,547 @@
 import os
+import hashlib
+import threading
 import numpy as np
 import librosa
 import json
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src import profiling
+from src.profiling import span
 
-def load_audio_files_with_metadata(directory):
+# In-memory record of a decoded track. ``audio`` and ``metadata`` come first so
+# ``track[0]`` / ``track[1]`` keep meaning what the (audio, metadata) tuples did.
+Track = namedtuple("Track", ["audio", "metadata", "sr", "duration", "path"])
+
+# A song of several stems, decoded together. ``audio`` is a (stems x samples)
+# array whose rows follow ``stems``; the last row is the summed mix.
+Song = namedtuple("Song", ["audio", "metadata", "sr", "duration", "path", "stems"])
+
+MIX = "mix"
+
+def _load_audio_file(directory, filename, sr=None):
+    """Decodes one audio file and reads its metadata JSON, if present.
+
+    Args:
+        directory (str): Directory containing the file.
+        filename (str): Name of the ``.wav`` file.
+        sr (int): Sample rate to resample to at load time, or None to keep the native rate.
+
+    Returns:
+        tuple: (filename, audio, sr, metadata), with metadata None when no JSON exists.
+    """
+    file_path = os.path.join(directory, filename)
+    with span("decode", track=filename):
+        audio, sr = librosa.load(file_path, sr=sr)
+    return filename, audio, sr, _read_metadata(directory, filename)
+
+def _resolve_workers(n_jobs):
+    """Turns an ``n_jobs`` argument into a worker count (None or -1 means all cores)."""
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+def _pool_context():
+    """Returns the multiprocessing context used for worker pools."""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def _iter_bounded(function, arguments, n_jobs=1, max_pending=None):
+    """Yields ``function(*args)`` for each argument tuple, in completion order.
+
+    With more than one worker the calls run in a process pool with at most
+    ``max_pending`` (default: twice the worker count) submitted but not yet
+    consumed results, so a slow consumer bounds memory. While profiling, the
+    workers' spans are shipped back with each result. Workers are started
+    through a fork server (``spawn`` where that is unavailable) rather than by
+    forking the caller, which may already be running decode or cache threads.
+    """
+    workers = _resolve_workers(n_jobs)
+    if workers == 1:
+        for args in arguments:
+            yield function(*args)
+        return
+
+    max_pending = max_pending or 2 * workers
+    remaining = iter(arguments)
+    options = profiling.worker_options()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+        pending = set()
+        for args in remaining:
+            pending.add(executor.submit(profiling.call_recorded, function, *args, **options))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, events = future.result()
+                profiling.add_events(events)
+                yield result
+                args = next(remaining, None)
+                if args is not None:
+                    pending.add(executor.submit(profiling.call_recorded, function, *args, **options))
+
+def _make_track(directory, filename, audio, sr, metadata):
+    """Wraps a decoded file into a ``Track``."""
+    return Track(audio, metadata, sr, len(audio) / sr, os.path.join(directory, filename))
+
+def load_track(path, sr=None):
+    """Loads a single audio file (and its metadata JSON, if present) as a ``Track``.
+
+    Args:
+        path (str): Path to the ``.wav`` file.
+        sr (int): Sample rate to resample to at load time, or None to keep the native rate.
+
+    Returns:
+        Track: The decoded track.
+    """
+    directory, filename = os.path.split(path)
+    _, audio, file_sr, metadata = _load_audio_file(directory, filename, sr)
+    return _make_track(directory, filename, audio, file_sr, metadata)
+
+def iter_audio_files(directory, n_jobs=1, max_pending=None, sr=None, filenames=None):
+    """Decodes the ``.wav`` files of a directory, yielding each one as soon as it is ready.
+
+    With ``n_jobs`` > 1 files are decoded in a process pool and yielded in
+    completion order. At most ``max_pending`` files (default: twice the
+    worker count) are in flight at once, so a slow consumer bounds memory.
+
+    Args:
+        directory (str): Path to the directory containing audio files and metadata.
+        n_jobs (int): Number of worker processes; 1 decodes in-process, None or -1 uses all cores.
+        max_pending (int): Maximum number of submitted but not yet consumed files.
+        sr (int): Sample rate to resample to at load time, or None to keep native rates.
+        filenames (list): Decode only these files of the directory instead of every ``.wav``.
+
+    Yields:
+        tuple: (filename, audio, sr, metadata), with metadata None when no JSON exists.
+    """
+    if filenames is None:
+        filenames = sorted(f for f in os.listdir(directory) if f.endswith('.wav'))
+    yield from _iter_bounded(_load_audio_file, [(directory, filename, sr) for filename in filenames],
+                             n_jobs, max_pending)
+
+def load_audio_files_with_metadata(directory, n_jobs=1, sr=None):
     """Loads multiple audio files along with their metadata.
 
     Args:
         directory (str): Path to the directory containing audio files and metadata.
+        n_jobs (int): Number of decoding processes (see ``iter_audio_files``).
+        sr (int): Canonical sample rate to resample every file to, or None to keep native rates.
 
     Returns:
-        dict: A dictionary where keys are filenames and values are tuples (audio data, metadata).
+        dict: A dictionary where keys are filenames and values are ``Track`` records
+        (audio data, metadata, sample rate, duration, path).
     """
     audio_data = {}
-    for filename in os.listdir(directory):
-        if filename.endswith('.wav'):
-            file_path = os.path.join(directory, filename)
-            audio, sr = librosa.load(file_path, sr=None)
-            metadata_file = filename.replace('.wav', '.json')
-            metadata_path = os.path.join(directory, metadata_file)
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                audio_data[filename] = (audio, metadata)
+    for filename, audio, file_sr, metadata in iter_audio_files(directory, n_jobs=n_jobs, sr=sr):
+        if metadata is not None:
+            audio_data[filename] = _make_track(directory, filename, audio, file_sr, metadata)
     return audio_data
 
-def load_audio_files(directory):
+def load_audio_files(directory, n_jobs=1, sr=None, filenames=None):
     """Loads multiple audio files from a directory.
 
     Args:
         directory (str): Path to the directory containing audio files.
+        n_jobs (int): Number of decoding processes (see ``iter_audio_files``).
+        sr (int): Canonical sample rate to resample every file to, or None to keep native rates.
+        filenames (list): Load only these files of the directory.
 
     Returns:
-        dict: A dictionary where keys are filenames and values are numpy arrays of audio data.
+        dict: A dictionary where keys are filenames and values are ``Track`` records
+        whose metadata is None.
     """
     audio_data = {}
-    for filename in os.listdir(directory):
-        if filename.endswith('.wav'):
-            file_path = os.path.join(directory, filename)
-            audio, sr = librosa.load(file_path, sr=None)
-            audio_data[filename] = audio
+    for filename, audio, file_sr, metadata in iter_audio_files(directory, n_jobs=n_jobs, sr=sr,
+                                                               filenames=filenames):
+        audio_data[filename] = _make_track(directory, filename, audio, file_sr, None)
     return audio_data
 
-def split_tracks(audio_data, segment_length=5):
+def discover_songs(root):
+    """Finds the songs of a ``<root>/<song>/<stem>.wav`` layout.
+
+    Args:
+        root (str): Directory with one subdirectory per song (e.g. ``data/raw/tracks``).
+
+    Returns:
+        dict: Song name to the sorted stem filenames of its directory; songs without stems are skipped.
+    """
+    songs = {}
+    for song in sorted(os.listdir(root)):
+        song_dir = os.path.join(root, song)
+        if os.path.isdir(song_dir):
+            stems = sorted(f for f in os.listdir(song_dir) if f.endswith('.wav'))
+            if stems:
+                songs[song] = stems
+    return songs
+
+def _decode_stem(path):
+    with span("decode", track=path):
+        return librosa.load(path, sr=None)
+
+def load_song(root, song, stems=None, sr=None, stem_threads=4, metadata_dir=None):
+    """Decodes every stem of a song and stacks them with their mix.
+
+    Stems are decoded in ``stem_threads`` threads and then resampled to a
+    common rate: ``sr``, or else the highest native rate among the stems.
+    Shorter stems are zero-padded to the longest. The summed mix is
+    appended as the last row.
+
+    Args:
+        root (str): Directory with one subdirectory per song.
+        song (str): Name of the song's subdirectory.
+        stems (list): Stem filenames; defaults to every ``.wav`` of the song.
+        sr (int): Common sample rate, or None for the highest native rate.
+        stem_threads (int): Number of threads decoding stems.
+        metadata_dir (str): Directory of ``<song>.json`` metadata; defaults to
+            ``metadata.json`` inside the song directory.
+
+    Returns:
+        Song: The stacked stems and mix.
+    """
+    song_dir = os.path.join(root, song)
+    if stems is None:
+        stems = sorted(f for f in os.listdir(song_dir) if f.endswith('.wav'))
+    paths = [os.path.join(song_dir, stem) for stem in stems]
+    with ThreadPoolExecutor(max_workers=max(1, min(stem_threads, len(paths)))) as executor:
+        decoded = list(executor.map(_decode_stem, paths))
+
+    target_sr = sr or max(stem_sr for _, stem_sr in decoded)
+    buffers = [audio if stem_sr == target_sr else librosa.resample(audio, orig_sr=stem_sr, target_sr=target_sr)
+               for audio, stem_sr in decoded]
+    length = max(len(audio) for audio in buffers)
+    stacked = np.zeros((len(buffers) + 1, length), dtype=np.float32)
+    for row, audio in enumerate(buffers):
+        stacked[row, :len(audio)] = audio
+    stacked[-1] = stacked[:-1].sum(axis=0)
+
+    metadata_path = (os.path.join(metadata_dir, song + '.json') if metadata_dir is not None
+                     else os.path.join(song_dir, 'metadata.json'))
+    metadata = None
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+    names = [os.path.splitext(stem)[0] for stem in stems] + [MIX]
+    return Song(stacked, metadata, target_sr, length / target_sr, song_dir, names)
+
+def _load_song_entry(root, song, stems, sr, stem_threads, metadata_dir):
+    return song, load_song(root, song, stems, sr, stem_threads, metadata_dir)
+
+def iter_songs(root, n_jobs=1, sr=None, stem_threads=4, metadata_dir=None, max_pending=None):
+    """Decodes the songs of a ``<root>/<song>/<stem>.wav`` layout, yielding each when ready.
+
+    Songs are decoded in ``n_jobs`` processes (see ``iter_audio_files``),
+    each decoding its stems in ``stem_threads`` threads.
+
+    Yields:
+        tuple: (song name, ``Song``), in completion order.
+    """
+    arguments = [(root, song, stems, sr, stem_threads, metadata_dir)
+                 for song, stems in discover_songs(root).items()]
+    yield from _iter_bounded(_load_song_entry, arguments, n_jobs, max_pending)
+
+def load_songs(root, n_jobs=1, sr=None, stem_threads=4, metadata_dir=None):
+    """Loads every song of a ``<root>/<song>/<stem>.wav`` layout.
+
+    Args:
+        root (str): Directory with one subdirectory per song (e.g. ``data/raw/tracks``).
+        n_jobs (int): Number of processes decoding songs; None or -1 uses all cores.
+        sr (int): Common sample rate for all stems, or None for each song's highest native rate.
+        stem_threads (int): Number of threads decoding the stems of one song.
+        metadata_dir (str): Directory of ``<song>.json`` metadata (see ``load_song``).
+
+    Returns:
+        dict: Song name to ``Song``, in song name order.
+    """
+    songs = dict(iter_songs(root, n_jobs, sr, stem_threads, metadata_dir))
+    return {song: songs[song] for song in sorted(songs)}
+
+def _read_metadata(directory, filename):
+    """Reads the metadata JSON of an audio file, or returns None if there is none."""
+    metadata_path = os.path.join(directory, filename.replace('.wav', '.json'))
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, 'r') as f:
+        return json.load(f)
+
+class AudioCatalog(Mapping):
+    """Read-only mapping of filename to ``Track`` that decodes audio on access.
+
+    The directory listing and metadata JSON files are read up front. Audio is
+    decoded only when a track is looked up, and decoded buffers are kept in a
+    least-recently-used cache of at most ``max_bytes`` bytes, so iterating
+    over a large library needs a fixed amount of memory.
+
+    ``cache_dir`` is opt-in. When it is set, each decoded buffer is also
+    written as a float32 ``.npy`` file keyed by path, size, mtime and sample
+    rate, and later decodes of an unchanged file become memory-mapped reads.
+    A file's copy is replaced when the file changes. Copies are removed least
+    recently used first once they exceed ``cache_max_bytes``. The directory
+    is listed once, on the first decode; after that, copies are found through
+    an in-memory index.
+
+    The catalog can be passed wherever the dictionaries returned by
+    ``load_audio_files_with_metadata`` are used.
+
+    Args:
+        directory (str): Path to the directory containing audio files and metadata.
+        sr (int): Sample rate to resample to at load time, or None to keep native rates.
+        max_bytes (int): Budget of the decoded-audio cache (at least one track is kept).
+        cache_dir (str): Directory for memory-mappable decoded copies, or None.
+        cache_max_bytes (int): Disk budget of ``cache_dir``, or None for no bound.
+        require_metadata (bool): Only index files with a metadata JSON, like
+            ``load_audio_files_with_metadata``.
+    """
+
+    def __init__(self, directory, sr=None, max_bytes=512 * 2 ** 20, cache_dir=None, require_metadata=False,
+                 cache_max_bytes=None):
+        self.directory = directory
+        self.sr = sr
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self._disk_bytes = None
+        self._copy_index = None
+        self._metadata = {}
+        for filename in sorted(f for f in os.listdir(directory) if f.endswith('.wav')):
+            metadata = _read_metadata(directory, filename)
+            if metadata is not None or not require_metadata:
+                self._metadata[filename] = metadata
+        self._tracks = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._metadata)
+
+    def __iter__(self):
+        return iter(self._metadata)
+
+    def __contains__(self, filename):
+        return filename in self._metadata
+
+    def __getitem__(self, filename):
+        if filename not in self._metadata:
+            raise KeyError(filename)
+        with self._lock:
+            track = self._tracks.get(filename)
+            if track is not None:
+                self._tracks.move_to_end(filename)
+                return track
+        audio, sr = self._decode(filename)
+        track = _make_track(self.directory, filename, audio, sr, self._metadata[filename])
+        with self._lock:
+            if filename not in self._tracks:
+                self._tracks[filename] = track
+                self._bytes += audio.nbytes
+            while self._bytes > self.max_bytes and len(self._tracks) > 1:
+                _, evicted = self._tracks.popitem(last=False)
+                self._bytes -= evicted.audio.nbytes
+        return track
+
+    def metadata(self, filename):
+        """Returns a file's metadata without decoding its audio."""
+        return self._metadata[filename]
+
+    def path(self, filename):
+        """Returns the full path of a file."""
+        return os.path.join(self.directory, filename)
+
+    def cached_bytes(self):
+        """Returns the number of bytes of decoded audio currently held."""
+        return self._bytes
+
+    def _decode(self, filename):
+        if not self.cache_dir:
+            _, audio, sr, _ = _load_audio_file(self.directory, filename, self.sr)
+            return audio, sr
+
+        path = self.path(filename)
+        stat = os.stat(path)
+        path_key = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=8).hexdigest()
+        state_key = hashlib.blake2b(repr((stat.st_size, stat.st_mtime_ns, self.sr)).encode(),
+                                    digest_size=8).hexdigest()
+        # Copies are named <path key>-<state key>-<sample rate>.npy: the rate
+        # spares native-rate loads a header read, and copies of the same path
+        # in an older state are stale
+        with self._lock:
+            if self._copy_index is None:
+                self._copy_index = {}
+                for _, _, copy in self._copies():
+                    self._index_copy(os.path.basename(copy))
+            names = list(self._copy_index.get(path_key, ()))
+        for name in names:
+            copy = os.path.join(self.cache_dir, name)
+            _, copy_state, copy_sr = name[:-4].split("-")
+            if copy_state != state_key:
+                self._remove_copy(copy)
+                continue
+            try:
+                if self.cache_max_bytes is not None:
+                    os.utime(copy)
+                return np.load(copy, mmap_mode='r'), int(copy_sr)
+            except FileNotFoundError:
+                # Trimmed by another catalog sharing the directory
+                with self._lock:
+                    self._forget_copy(name)
+
+        _, audio, sr, _ = _load_audio_file(self.directory, filename, self.sr)
+        target = os.path.join(self.cache_dir, f"{path_key}-{state_key}-{sr}.npy")
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, audio)
+        os.replace(tmp, target)
+        with self._lock:
+            self._index_copy(os.path.basename(target))
+        if self.cache_max_bytes is not None:
+            self._account_copy(os.path.getsize(target))
+        return np.load(target, mmap_mode='r'), sr
+
+    def _index_copy(self, name):
+        """Adds a copy to the in-memory index of ``cache_dir``; the caller holds the lock."""
+        if name.count("-") == 2:
+            names = self._copy_index.setdefault(name.split("-", 1)[0], [])
+            if name not in names:
+                names.append(name)
+
+    def _forget_copy(self, name):
+        """Drops a copy from the in-memory index; the caller holds the lock."""
+        if self._copy_index is None:
+            return
+        path_key = name.split("-", 1)[0]
+        names = self._copy_index.get(path_key, [])
+        if name in names:
+            names.remove(name)
+            if not names:
+                del self._copy_index[path_key]
+
+    def _copies(self):
+        """Returns (mtime, size, path) of every decoded copy in ``cache_dir``."""
+        copies = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                copies.append((stat.st_mtime, stat.st_size, entry.path))
+        return copies
+
+    def _remove_copy(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            size = None
+        with self._lock:
+            self._forget_copy(os.path.basename(path))
+            if size is not None and self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _account_copy(self, size):
+        """Adds a new copy to the disk total and trims least recently used copies when over budget."""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._copies())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes <= self.cache_max_bytes:
+                return
+            # Trim to 90% of the budget so the directory scan is not repeated on every decode
+            copies = sorted(self._copies())
+            total = sum(size for _, size, _ in copies)
+            for _, size, path in copies[:-1]:
+                if total <= 0.9 * self.cache_max_bytes:
+                    break
+                try:
+                    os.remove(path)  # Open memory maps of the copy stay valid
+                except OSError:
+                    continue
+                self._forget_copy(os.path.basename(path))
+                total -= size
+            self._disk_bytes = total
+
+def track_metadata(audio_data, filename):
+    """Returns the metadata of one entry of ``audio_data``, decoding nothing for an ``AudioCatalog``."""
+    if isinstance(audio_data, AudioCatalog):
+        return audio_data.metadata(filename)
+    return audio_data[filename][1]
+
+def segment_audio(audio, sr, segment_length=5, hop_length=None, tail="pad"):
+    """Frames an audio buffer into fixed-length, possibly overlapping segments.
+
+    The result is a strided (segments x samples) view over ``audio``, so no
+    samples are copied unless the tail has to be padded. The 2-D result can be
+    passed straight to ``compute_features`` to analyse every segment at once.
+
+    Args:
+        audio (np.ndarray): 1-D audio signal.
+        sr (int): Sample rate of the signal.
+        segment_length (float): Length of each segment in seconds.
+        hop_length (float): Seconds between segment starts; defaults to ``segment_length`` (no overlap).
+        tail (str): "pad" zero-pads a partial last segment (copying the buffer once),
+            "drop" discards it and never copies.
+
+    Returns:
+        np.ndarray: Array of shape (segments, samples per segment).
+    """
+    if tail not in ("pad", "drop"):
+        raise ValueError(f"Unknown tail policy: {tail}")
+    num_samples = int(sr * segment_length)
+    hop_samples = int(sr * hop_length) if hop_length is not None else num_samples
+    if num_samples <= 0 or hop_samples <= 0:
+        raise ValueError("segment_length and hop_length must cover at least one sample")
+
+    if tail == "pad":
+        num_segments = 1 + max(0, -(-(len(audio) - num_samples) // hop_samples))
+        padded_length = (num_segments - 1) * hop_samples + num_samples
+        if padded_length > len(audio):
+            padded = np.zeros(padded_length, dtype=audio.dtype)
+            padded[:len(audio)] = audio
+            audio = padded
+    elif len(audio) < num_samples:
+        return np.empty((0, num_samples), dtype=audio.dtype)
+    return np.lib.stride_tricks.sliding_window_view(audio, num_samples)[::hop_samples]
+
+def split_tracks(audio_data, segment_length=5, sr=None, hop_length=None, tail="pad"):
     """Splits multiple audio tracks into segments.
 
     Args:
-        audio_data (dict): Dictionary of audio data where keys are filenames.
-        segment_length (int): Length of each segment in seconds.
+        audio_data (dict): Dictionary of ``Track`` records (or raw audio arrays) where keys are filenames.
+        segment_length (float): Length of each segment in seconds.
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
+        hop_length (float): Seconds between segment starts; defaults to ``segment_length``.
+        tail (str): Policy for a partial last segment, see ``segment_audio``.
 
     Returns:
-        dict: A dictionary with segmented audio data.
+        dict: A dictionary mapping filenames to (segments x samples) arrays.
     """
     segmented_data = {}
-    for filename, audio in audio_data.items():
-        segments = []
-        sr = librosa.get_samplerate(filename)
-        num_samples = sr * segment_length
-        for start in range(0, len(audio), num_samples):
-            segment = audio[start:start + num_samples]
-            segments.append(segment)
-        segmented_data[filename] = segments
+    for filename, track in audio_data.items():
+        audio, track_sr = track_audio(filename, track, sr)
+        segmented_data[filename] = segment_audio(audio, track_sr, segment_length,
+                                                 hop_length=hop_length, tail=tail)
     return segmented_data
+
+def track_audio(filename, track, sr=None):
+    """Returns the audio buffer and sample rate of an ``audio_data`` value.
+
+    Args:
+        filename (str): Key of the value, used in error messages.
+        track: A ``Track`` or ``Song``, an (audio, metadata) tuple or a raw audio array.
+        sr (int): Sample rate to assume for values that do not carry one.
+
+    Returns:
+        tuple: (audio, sr)
+
+    Raises:
+        ValueError: If the sample rate is unknown.
+    """
+    if isinstance(track, (Track, Song)):
+        return track.audio, track.sr
+    audio = track[0] if isinstance(track, tuple) else track
+    if sr is None:
+        raise ValueError(f"Sample rate of {filename} is unknown; load it as a Track or pass sr")
+    return audio, sr
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import librosa
+
+# Bump when the feature computation changes in a way that invalidates cached arrays.
+FEATURE_VERSION = 1
+
+# Fraction of the size budget an over-budget cache is trimmed down to, so the
+# directory scan behind an eviction happens once per batch of writes rather
+# than on every write.
+_EVICT_LOW_WATER = 0.9
+
+_default_cache = None
+
+def audio_digest(audio):
+    """Returns a content hash of a decoded audio buffer.
+
+    Args:
+        audio (np.ndarray): Audio signal.
+
+    Returns:
+        str: Hex digest of the buffer's dtype, shape and samples.
+    """
+    audio = np.ascontiguousarray(audio)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{audio.dtype.str}{audio.shape}".encode())
+    h.update(memoryview(audio).cast("B"))
+    return h.hexdigest()
+
+def file_digest(path, chunk_size=1 << 20):
+    """Returns a content hash of a file on disk.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def params_digest(params):
+    """Returns a hash of extraction parameters, the librosa version and ``FEATURE_VERSION``."""
+    payload = dict(params, librosa=librosa.__version__, feature_version=FEATURE_VERSION)
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode(),
+                           digest_size=8).hexdigest()
+
+class FeatureCache:
+    """Content-addressed on-disk store of feature arrays with size-bounded LRU eviction.
+
+    Each entry is a directory ``<audio digest>-<params digest>`` holding one
+    ``.npy`` file per feature, read back memory-mapped. An entry's mtime is
+    refreshed on every hit, and the least recently used entries are removed
+    once the cache grows beyond ``max_bytes``. The cache size is tracked as
+    entries are written, so only an eviction scans the directory.
+
+    Args:
+        directory (str): Directory holding the cache entries.
+        max_bytes (int): Size budget in bytes, or None for an unbounded cache.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, audio, params):
+        """Builds the cache key for an audio buffer and extraction parameters."""
+        return f"{audio_digest(audio)}-{params_digest(params)}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, names):
+        """Returns the cached features among ``names`` for ``key``.
+
+        Args:
+            key (str): Cache key from ``key``.
+            names (iterable): Feature names wanted.
+
+        Returns:
+            dict: Feature name to memory-mapped array, for the names that are cached.
+        """
+        entry = self._entry_path(key)
+        found = {}
+        for name in names:
+            path = os.path.join(entry, f"{name}.npy")
+            try:
+                found[name] = np.load(path, mmap_mode='r')
+            except (FileNotFoundError, ValueError):
+                continue
+        if found:
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+        return found
+
+    def put(self, key, features):
+        """Stores feature arrays under ``key`` and enforces the size budget.
+
+        Args:
+            key (str): Cache key from ``key``.
+            features (dict): Feature name to array.
+        """
+        entry = self._entry_path(key)
+        os.makedirs(entry, exist_ok=True)
+        written = 0
+        for name, array in features.items():
+            path = os.path.join(entry, f"{name}.npy")
+            fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+            written += os.path.getsize(tmp_path)
+            if os.path.exists(path):
+                written -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+        os.utime(entry)
+        if self.max_bytes is None:
+            return
+        # The running total may miss writes by other processes; every eviction rescans
+        self._size = self.size() if self._size is None else self._size + written
+        if self._size > self.max_bytes:
+            self._size = self.evict(int(self.max_bytes * _EVICT_LOW_WATER))
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+            entries.append((os.stat(path).st_mtime, size, path))
+        return entries
+
+    def size(self):
+        """Returns the total size of the cached arrays in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes):
+        """Removes least recently used entries until the cache fits in ``max_bytes``.
+
+        Returns:
+            int: Size of the remaining entries in bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._size = total
+        return total
+
+    def invalidate(self, key=None, audio=None):
+        """Removes cached entries.
+
+        Args:
+            key (str): Remove this single entry.
+            audio (np.ndarray): Remove every entry computed from this buffer, whatever the parameters.
+        """
+        self._size = None
+        if key is not None:
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+        if audio is not None:
+            prefix = audio_digest(audio) + '-'
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    shutil.rmtree(self._entry_path(name), ignore_errors=True)
+
+    def clear(self):
+        """Removes every cached entry."""
+        self._size = None
+        for _, _, path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+def configure_cache(directory, max_bytes=None):
+    """Sets the cache the feature extractors consult by default.
+
+    Args:
+        directory (str): Cache directory, or None to disable the default cache.
+        max_bytes (int): Size budget in bytes.
+
+    Returns:
+        FeatureCache: The configured cache, or None when disabled.
+    """
+    global _default_cache
+    _default_cache = FeatureCache(directory, max_bytes) if directory else None
+    return _default_cache
+
+def get_default_cache():
+    """Returns the default cache, configuring it from ``MASTERIA_FEATURE_CACHE`` on first use."""
+    global _default_cache
+    if _default_cache is None and os.environ.get("MASTERIA_FEATURE_CACHE"):
+        max_bytes = os.environ.get("MASTERIA_FEATURE_CACHE_MAX_BYTES")
+        _default_cache = FeatureCache(os.environ["MASTERIA_FEATURE_CACHE"],
+                                      int(max_bytes) if max_bytes else None)
+    return _default_cache
@@ -1,56 +1,410 @@
+import functools
 import numpy as np
 import librosa
+import soundfile as sf
+from src.feature_cache import get_default_cache
+from src.data_processing import _iter_bounded, discover_songs, load_song, track_audio
+from src.profiling import span
 
-def extract_basic_features(audio_data):
-    """Extracts basic audio features (e.g., spectral, loudness) from the audio tracks.
+# Frame-level features the engine can compute. Everything except "rmse" (which
+# is a cheap time-domain statistic) is derived from one shared magnitude STFT.
+FEATURE_NAMES = ("spectral_centroid", "rmse", "spectral_bandwidth", "mel", "mfcc")
+SPECTRAL_FEATURE_NAMES = ("spectral_centroid", "spectral_bandwidth", "mel", "mfcc")
+
+@functools.lru_cache(maxsize=16)
+def _mel_basis(sr, n_fft, n_mels):
+    """Returns the (cached) mel filterbank for a sample rate and FFT size."""
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+def _power_to_db(S, top_db=80.0, amax=None):
+    """Converts a power spectrogram to dB, like ``librosa.power_to_db`` with ``ref=1.0``.
+
+    ``amax`` is the peak used for the ``top_db`` floor; it defaults to the peak
+    of each signal (over the last two axes), so batches of signals are clipped
+    independently.
+    """
+    amin = 1e-10
+    log_spec = 10.0 * np.log10(np.maximum(amin, S))
+    if top_db is not None:
+        if amax is None:
+            amax = S.max(axis=(-2, -1), keepdims=True)
+        log_spec = np.maximum(log_spec, 10.0 * np.log10(np.maximum(amin, amax)) - top_db)
+    return log_spec
+
+def magnitude_spectrogram(audio, n_fft=2048, hop_length=512, center=True):
+    """Computes the magnitude STFT shared by every feature of the engine.
 
     Args:
-        audio_data (dict): Dictionary of audio data.
+        audio (np.ndarray): Audio signal(s); the last axis is time.
+        n_fft (int): FFT window size.
+        hop_length (int): Number of samples between frames.
+        center (bool): Whether frames are centered (zero padding at both ends).
 
     Returns:
-        dict: Dictionary of extracted features.
+        np.ndarray: Magnitude spectrogram of shape (..., 1 + n_fft // 2, frames).
+    """
+    return np.abs(librosa.stft(audio, n_fft=n_fft, hop_length=hop_length,
+                               center=center, pad_mode="constant"))
+
+def features_from_magnitude(S, sr, include=SPECTRAL_FEATURE_NAMES, n_fft=2048, n_mels=128,
+                            n_mfcc=13, top_db=80.0, mel_peak=None):
+    """Derives frame-level spectral features from a precomputed magnitude spectrogram.
+
+    Args:
+        S (np.ndarray): Magnitude spectrogram from ``magnitude_spectrogram``.
+        sr (int): Sample rate of the analysed audio.
+        include (iterable): Names from ``SPECTRAL_FEATURE_NAMES`` to compute.
+        n_fft (int): FFT window size used for ``S``.
+        n_mels (int): Number of mel bands.
+        n_mfcc (int): Number of MFCCs to return.
+        top_db (float): Dynamic range floor applied to the log-mel before the DCT.
+        mel_peak (float): Mel power peak used for the ``top_db`` floor; defaults to the peak of ``S``.
+
+    Returns:
+        dict: Feature name to array of shape (..., n, frames).
+    """
+    include = set(include)
+    unknown = include.difference(SPECTRAL_FEATURE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown spectral features requested: {sorted(unknown)}")
+
+    result = {}
+    if "spectral_centroid" in include or "spectral_bandwidth" in include:
+        freq = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        centroid = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=n_fft, freq=freq)
+        if "spectral_centroid" in include:
+            result["spectral_centroid"] = centroid
+        if "spectral_bandwidth" in include:
+            result["spectral_bandwidth"] = librosa.feature.spectral_bandwidth(
+                S=S, sr=sr, n_fft=n_fft, freq=freq, centroid=centroid)
+    if "mel" in include or "mfcc" in include:
+        mel = np.einsum("...ft,mf->...mt", S ** 2, _mel_basis(sr, n_fft, n_mels), optimize=True)
+        if "mel" in include:
+            result["mel"] = mel
+        if "mfcc" in include:
+            log_mel = _power_to_db(mel, top_db=top_db, amax=mel_peak)
+            result["mfcc"] = librosa.feature.mfcc(S=log_mel, n_mfcc=n_mfcc)
+    return result
+
+def compute_features(audio, sr, include=FEATURE_NAMES, n_fft=2048, hop_length=512,
+                     n_mels=128, n_mfcc=13, top_db=80.0):
+    """Computes any subset of frame-level features from one shared STFT.
+
+    Args:
+        audio (np.ndarray): Audio signal(s); the last axis is time.
+        sr (int): Sample rate.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        n_fft (int): FFT window size.
+        hop_length (int): Number of samples between frames.
+        n_mels (int): Number of mel bands.
+        n_mfcc (int): Number of MFCCs to return.
+        top_db (float): Dynamic range floor applied to the log-mel before the DCT.
+
+    Returns:
+        dict: Feature name to array of shape (..., n, frames).
+    """
+    include = set(include)
+    unknown = include.difference(FEATURE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown features requested: {sorted(unknown)}")
+
+    result = {}
+    spectral = include.intersection(SPECTRAL_FEATURE_NAMES)
+    if spectral:
+        S = magnitude_spectrogram(audio, n_fft=n_fft, hop_length=hop_length)
+        result.update(features_from_magnitude(S, sr, include=spectral, n_fft=n_fft,
+                                              n_mels=n_mels, n_mfcc=n_mfcc, top_db=top_db))
+    if "rmse" in include:
+        result["rmse"] = librosa.feature.rms(y=audio, frame_length=n_fft, hop_length=hop_length)
+    return result
+
+def _cached_features(audio, sr, include, cache, n_fft=2048, hop_length=512, n_mels=128,
+                     n_mfcc=13, top_db=80.0):
+    """Runs ``compute_features`` for the features missing from ``cache``."""
+    params = dict(sr=sr, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels,
+                  n_mfcc=n_mfcc, top_db=top_db)
+    if cache is None:
+        return compute_features(audio, include=include, **params)
+    key = cache.key(audio, params)
+    result = cache.get(key, include)
+    missing = [name for name in include if name not in result]
+    if missing:
+        computed = compute_features(audio, include=missing, **params)
+        cache.put(key, computed)
+        result.update(computed)
+    return result
+
+def extract_features(audio_data, include=FEATURE_NAMES, cache=None, sr=None, **kwargs):
+    """Computes the requested feature subset for multiple audio tracks.
+
+    Args:
+        audio_data (dict): Dictionary of ``Track`` records (or raw audio arrays) where keys are filenames.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        cache (FeatureCache): Cache to consult; None uses the default cache, False disables caching.
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
+        **kwargs: STFT and feature parameters forwarded to ``compute_features``.
+
+    Returns:
+        dict: A dictionary mapping filenames to feature dictionaries.
     """
+    if cache is None:
+        cache = get_default_cache()
+    include = tuple(include)
     features = {}
-    for filename, (audio, _) in audio_data.items():
-        sr = librosa.get_samplerate(filename)
-        spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)
-        rmse = librosa.feature.rms(y=audio)
-        loudness = np.mean(librosa.feature.spectral_bandwidth(y=audio, sr=sr))
-        features[filename] = {
-            "spectral_centroid": np.mean(spectral_centroid),
-            "rmse": np.mean(rmse),
-            "loudness": loudness
-        }
+    for filename, track in audio_data.items():
+        audio, track_sr = track_audio(filename, track, sr)
+        with span("extract_features", track=filename):
+            features[filename] = _cached_features(audio, track_sr, include, cache or None, **kwargs)
     return features
 
-def extract_mfcc(audio_data, n_mfcc=13):
+def extract_basic_features(audio_data, cache=None, sr=None):
+    """Extracts basic audio features (e.g., spectral, loudness) from the audio tracks.
+
+    Args:
+        audio_data (dict): Dictionary of ``Track`` records (or raw audio arrays).
+        cache (FeatureCache): Cache to consult; None uses the default cache, False disables caching.
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
+
+    Returns:
+        dict: Dictionary of extracted features.
+    """
+    frame_features = extract_features(
+        audio_data, include=("spectral_centroid", "rmse", "spectral_bandwidth"), cache=cache, sr=sr)
+    return {filename: summarize_basic_features(frames) for filename, frames in frame_features.items()}
+
+def summarize_basic_features(frames):
+    """Reduces frame-level features of one track to the ``extract_basic_features`` summary.
+
+    Args:
+        frames (dict): ``compute_features`` output including spectral_centroid,
+            rmse and spectral_bandwidth.
+
+    Returns:
+        dict: Mean spectral centroid, RMS energy and spectral bandwidth ("loudness").
+    """
+    return {
+        "spectral_centroid": np.mean(frames["spectral_centroid"]),
+        "rmse": np.mean(frames["rmse"]),
+        "loudness": np.mean(frames["spectral_bandwidth"])
+    }
+
+def extract_mfcc(audio_data, n_mfcc=13, cache=None, sr=None):
     """Extract MFCC features from multiple audio tracks.
 
     Args:
         audio_data (dict): Dictionary of audio data where keys are filenames.
         n_mfcc (int): Number of MFCCs to return.
+        cache (FeatureCache): Cache to consult; None uses the default cache, False disables caching.
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
 
     Returns:
         dict: A dictionary with MFCC features.
     """
-    mfcc_features = {}
-    for filename, audio in audio_data.items():
-        mfccs = librosa.feature.mfcc(y=audio, sr=librosa.get_samplerate(filename), n_mfcc=n_mfcc)
-        mfcc_features[filename] = mfccs
-    return mfcc_features
+    frame_features = extract_features(audio_data, include=("mfcc",), n_mfcc=n_mfcc,
+                                      cache=cache, sr=sr)
+    return {filename: frames["mfcc"] for filename, frames in frame_features.items()}
 
-def extract_spectrogram(audio_data):
+def extract_spectrogram(audio_data, cache=None, sr=None):
     """Extract spectrogram features from multiple audio tracks.
 
     Args:
         audio_data (dict): Dictionary of audio data where keys are filenames.
+        cache (FeatureCache): Cache to consult; None uses the default cache, False disables caching.
+        sr (int): Sample rate of raw audio arrays; ``Track`` records carry their own.
 
     Returns:
         dict: A dictionary with spectrogram features.
     """
-    spectrograms = {}
-    for filename, audio in audio_data.items():
-        D = np.abs(librosa.stft(audio))**2
-        S = librosa.feature.melspectrogram(S=D, sr=librosa.get_samplerate(filename))
-        spectrograms[filename] = S
-    return spectrograms
+    frame_features = extract_features(audio_data, include=("mel",), cache=cache, sr=sr)
+    return {filename: frames["mel"] for filename, frames in frame_features.items()}
+
+def song_features(song, include=FEATURE_NAMES, **kwargs):
+    """Computes features for every stem of a song and its mix in one stacked pass.
+
+    Args:
+        song (Song): Song from ``load_song`` / ``load_songs``.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        **kwargs: Parameters forwarded to ``compute_features``.
+
+    Returns:
+        dict: ``stems`` (row names, the mix last) and each feature as an
+        array of shape (stems + 1, n, frames).
+    """
+    with span("extract_song_features", track=song.path):
+        features = compute_features(song.audio, song.sr, include=include, **kwargs)
+    features["stems"] = list(song.stems)
+    return features
+
+def extract_song_features(songs, include=FEATURE_NAMES, **kwargs):
+    """Extracts stacked stem features for already loaded songs.
+
+    Args:
+        songs (dict): Song name to ``Song``.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        **kwargs: Parameters forwarded to ``compute_features``.
+
+    Returns:
+        dict: Song name to ``song_features`` output.
+    """
+    return {name: song_features(song, include, **kwargs) for name, song in songs.items()}
+
+def _load_song_features(root, song, stems, sr, stem_threads, metadata_dir, include, kwargs):
+    return song, song_features(load_song(root, song, stems, sr, stem_threads, metadata_dir), include, **kwargs)
+
+def iter_song_features(root, include=FEATURE_NAMES, n_jobs=1, sr=None, stem_threads=4, metadata_dir=None,
+                       max_pending=None, **kwargs):
+    """Decodes and featurises the songs of a ``<root>/<song>/<stem>.wav`` layout in parallel.
+
+    Each song is decoded and analysed inside one of ``n_jobs`` worker
+    processes, so only the features travel back to the caller.
+
+    Args:
+        root (str): Directory with one subdirectory per song.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        n_jobs (int): Number of worker processes; None or -1 uses all cores.
+        sr (int): Common sample rate, or None for each song's highest native rate.
+        stem_threads (int): Number of threads decoding the stems of one song.
+        metadata_dir (str): Directory of ``<song>.json`` metadata (see ``load_song``).
+        max_pending (int): Maximum number of songs in flight.
+        **kwargs: Parameters forwarded to ``compute_features``.
+
+    Yields:
+        tuple: (song name, ``song_features`` output), in completion order.
+    """
+    arguments = [(root, song, stems, sr, stem_threads, metadata_dir, tuple(include), kwargs)
+                 for song, stems in discover_songs(root).items()]
+    yield from _iter_bounded(_load_song_features, arguments, n_jobs, max_pending)
+
+def summarize_song_features(features):
+    """Turns ``song_features`` output into ``extract_basic_features``-style summaries per stem.
+
+    Args:
+        features (dict): Output of ``song_features`` including the spectral
+            centroid, RMS energy and spectral bandwidth.
+
+    Returns:
+        dict: Stem name (including ``"mix"``) to mean spectral centroid, RMS energy and bandwidth ("loudness").
+    """
+    means = {name: features[name].mean(axis=(-2, -1))
+             for name in ("spectral_centroid", "rmse", "spectral_bandwidth")}
+    return {stem: {"spectral_centroid": float(means["spectral_centroid"][i]),
+                   "rmse": float(means["rmse"][i]),
+                   "loudness": float(means["spectral_bandwidth"][i])}
+            for i, stem in enumerate(features["stems"])}
+
+def _iter_padded_blocks(path, n_fft, hop_length, block_frames):
+    """Streams a file as overlapping, already-padded analysis blocks.
+
+    The stream is zero-padded by ``n_fft // 2`` samples at both ends, exactly
+    like a centered STFT, so analysing each block with ``center=False`` gives
+    the same frames as the one-shot path. Consecutive blocks overlap by
+    ``n_fft - hop_length`` samples.
+
+    Yields:
+        tuple: (block, sr), with ``block`` a mono float32 array holding a whole number of frames.
+    """
+    pad = n_fft // 2
+    with sf.SoundFile(path) as f:
+        sr = f.samplerate
+        buf = np.zeros(pad, dtype=np.float32)
+        at_end = False
+        while not at_end:
+            chunk = f.read(block_frames * hop_length, dtype='float32', always_2d=True)
+            if len(chunk) == 0:
+                at_end = True
+                chunk = np.zeros(pad, dtype=np.float32)
+            else:
+                chunk = chunk.mean(axis=1) if chunk.shape[1] > 1 else chunk[:, 0]
+            buf = np.concatenate([buf, chunk])
+            if len(buf) < n_fft:
+                continue
+            n_frames = 1 + (len(buf) - n_fft) // hop_length
+            yield buf[:(n_frames - 1) * hop_length + n_fft], sr
+            buf = buf[n_frames * hop_length:]
+
+def iter_feature_blocks(path, include=FEATURE_NAMES, block_frames=1024, n_fft=2048,
+                        hop_length=512, n_mels=128, n_mfcc=13, top_db=80.0):
+    """Computes frame-level features of a file block by block, reading it from disk.
+
+    Memory is bounded by ``block_frames`` rather than the file length, and the
+    concatenated blocks match ``compute_features`` on the fully loaded file at
+    its native sample rate. MFCCs with a ``top_db`` floor need the peak mel
+    power of the whole file, which costs one extra pass over the file.
+
+    Args:
+        path (str): Path to the audio file.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        block_frames (int): Number of feature frames per block.
+        n_fft (int): FFT window size.
+        hop_length (int): Number of samples between frames.
+        n_mels (int): Number of mel bands.
+        n_mfcc (int): Number of MFCCs to return.
+        top_db (float): Dynamic range floor applied to the log-mel before the DCT.
+
+    Yields:
+        dict: Feature name to array of shape (n, block frames).
+    """
+    include = set(include)
+    unknown = include.difference(FEATURE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown features requested: {sorted(unknown)}")
+    spectral = include.intersection(SPECTRAL_FEATURE_NAMES)
+    params = dict(n_fft=n_fft, n_mels=n_mels, n_mfcc=n_mfcc, top_db=top_db)
+
+    mel_peak = None
+    if "mfcc" in include and top_db is not None:
+        mel_peak = 0.0
+        for block, sr in _iter_padded_blocks(path, n_fft, hop_length, block_frames):
+            S = magnitude_spectrogram(block, n_fft=n_fft, hop_length=hop_length, center=False)
+            mel = features_from_magnitude(S, sr, include=("mel",), **params)["mel"]
+            mel_peak = max(mel_peak, float(mel.max()))
+
+    for block, sr in _iter_padded_blocks(path, n_fft, hop_length, block_frames):
+        result = {}
+        if spectral:
+            S = magnitude_spectrogram(block, n_fft=n_fft, hop_length=hop_length, center=False)
+            result.update(features_from_magnitude(S, sr, include=spectral, mel_peak=mel_peak,
+                                                  **params))
+        if "rmse" in include:
+            result["rmse"] = librosa.feature.rms(y=block, frame_length=n_fft,
+                                                 hop_length=hop_length, center=False)
+        yield result
+
+def extract_features_blockwise(path, include=FEATURE_NAMES, **kwargs):
+    """Computes frame-level features of a file with bounded audio memory.
+
+    Args:
+        path (str): Path to the audio file.
+        include (iterable): Names from ``FEATURE_NAMES`` to compute.
+        **kwargs: Block and feature parameters forwarded to ``iter_feature_blocks``.
+
+    Returns:
+        dict: Feature name to array of shape (n, frames), as returned by ``compute_features``.
+    """
+    blocks = {name: [] for name in include}
+    for block in iter_feature_blocks(path, include=include, **kwargs):
+        for name, values in block.items():
+            blocks[name].append(values)
+    return {name: np.concatenate(values, axis=-1) for name, values in blocks.items()}
+
+def extract_basic_features_blockwise(path, **kwargs):
+    """Computes the ``extract_basic_features`` summary of one file without loading it whole.
+
+    Args:
+        path (str): Path to the audio file.
+        **kwargs: Block and feature parameters forwarded to ``iter_feature_blocks``.
+
+    Returns:
+        dict: Mean spectral centroid, RMS energy and spectral bandwidth ("loudness").
+    """
+    sums = {"spectral_centroid": 0.0, "rmse": 0.0, "spectral_bandwidth": 0.0}
+    n_frames = 0
+    for block in iter_feature_blocks(path, include=tuple(sums), **kwargs):
+        for name in sums:
+            sums[name] += float(np.sum(block[name], dtype=np.float64))
+        n_frames += block["rmse"].shape[-1]
+    return {
+        "spectral_centroid": sums["spectral_centroid"] / n_frames,
+        "rmse": sums["rmse"] / n_frames,
+        "loudness": sums["spectral_bandwidth"] / n_frames
+    }
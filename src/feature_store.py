@@ -0,0 +1,227 @@
+# feature_store.py
+import json
+import os
+import numpy as np
+
+STORE_VERSION = 1
+_SCHEMA_FILE = "store.json"
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+def _file_state(path):
+    """Returns the [size, mtime_ns] of a source file, or None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _source_path(audio_data, filename):
+    """Returns the file a track was decoded from, without decoding an ``AudioCatalog`` track."""
+    if callable(getattr(audio_data, "path", None)):
+        return audio_data.path(filename)
+    return getattr(audio_data[filename], "path", None)
+
+class FeatureStore:
+    """Library-wide columnar store of per-track feature summaries.
+
+    Features live in one float32 matrix with a row per track. A filename
+    index and a named column schema go with it, so column order is explicit
+    rather than implied by dict ordering. On disk the store is a directory
+    of ``.npy`` chunks. Each chunk has a JSON file with its row filenames
+    and the size and mtime of the file each row was extracted from, and
+    ``store.json`` lists the columns and chunks. Chunks are read
+    memory-mapped. ``append`` writes a new chunk. A track appended again
+    supersedes its earlier row, and ``compact`` merges everything into a
+    single chunk.
+
+    Args:
+        directory (str): Store directory (created if missing).
+        columns (list): Column names for a new store; inferred from the first
+            append if None. Must match an existing store's schema.
+    """
+
+    def __init__(self, directory, columns=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, _SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                schema = json.load(f)
+            if schema.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported feature store version in {directory}")
+            if columns is not None and list(columns) != schema["columns"]:
+                raise ValueError(f"Columns {list(columns)} do not match the store's {schema['columns']}")
+            self.columns = tuple(schema["columns"])
+            self._chunks = schema["chunks"]
+        else:
+            self.columns = tuple(columns) if columns is not None else None
+            self._chunks = []
+        self._load()
+
+    def _load(self):
+        self._arrays, latest, states = [], {}, {}
+        for c, chunk in enumerate(self._chunks):
+            self._arrays.append(np.load(os.path.join(self.directory, chunk + ".npy"), mmap_mode='r'))
+            with open(os.path.join(self.directory, chunk + ".json")) as f:
+                rows = json.load(f)
+            if isinstance(rows, list):  # Chunks written before source states were kept
+                rows = {"filenames": rows}
+            for r, filename in enumerate(rows["filenames"]):
+                latest[filename] = (c, r)
+                states[filename] = rows["states"][r] if "states" in rows else None
+        live = sorted(latest.items(), key=lambda item: item[1])
+        self.states = states
+        self.filenames = [filename for filename, _ in live]
+        self.index = {filename: i for i, filename in enumerate(self.filenames)}
+        self._live = live
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __contains__(self, filename):
+        return filename in self.index
+
+    def matrix(self):
+        """Returns the (tracks x columns) float32 matrix, memory-mapped when the store is compact."""
+        if self._matrix is None:
+            n_columns = len(self.columns or ())
+            if len(self._arrays) == 1 and len(self._live) == len(self._arrays[0]):
+                self._matrix = self._arrays[0]
+            elif not self._live:
+                self._matrix = np.empty((0, n_columns), dtype=np.float32)
+            else:
+                chunk_ids = np.array([c for _, (c, _) in self._live])
+                row_ids = np.array([r for _, (_, r) in self._live])
+                self._matrix = np.concatenate([self._arrays[c][row_ids[chunk_ids == c]]
+                                               for c in np.unique(chunk_ids)])
+        return self._matrix
+
+    def rows(self, filenames):
+        """Returns the feature rows of the given tracks, in that order."""
+        return self.matrix()[[self.index[filename] for filename in filenames]]
+
+    def column(self, name):
+        """Returns one named column over all tracks."""
+        return self.matrix()[:, self.columns.index(name)]
+
+    def append(self, features, states=None):
+        """Adds per-track feature dictionaries as a new chunk.
+
+        Args:
+            features (dict): Filename to ``{column: value}``, e.g. the output
+                of ``extract_basic_features``.
+            states (dict): Filename to the [size, mtime_ns] of its source file.
+
+        Raises:
+            ValueError: If a track's feature names differ from the schema.
+        """
+        filenames = list(features)
+        if self.columns is None and filenames:
+            self.columns = tuple(features[filenames[0]])
+        X = np.empty((len(filenames), len(self.columns or ())), dtype=np.float32)
+        for i, filename in enumerate(filenames):
+            row = features[filename]
+            if set(row) != set(self.columns):
+                raise ValueError(f"Features of {filename} ({sorted(row)}) do not match the "
+                                 f"store's columns ({list(self.columns)})")
+            X[i] = [row[name] for name in self.columns]
+        self.append_rows(filenames, X, [(states or {}).get(filename) for filename in filenames])
+
+    def append_rows(self, filenames, X, states=None):
+        """Adds rows already laid out in the store's column order as a new chunk.
+
+        ``states`` optionally lists the [size, mtime_ns] of each row's source file.
+        """
+        if not len(filenames):
+            return
+        if self.columns is None:
+            raise ValueError("The store has no column schema yet")
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape != (len(filenames), len(self.columns)):
+            raise ValueError(f"Expected a ({len(filenames)}, {len(self.columns)}) matrix, got {X.shape}")
+        rows = {"filenames": list(filenames),
+                "states": list(states) if states is not None else [None] * len(filenames)}
+        chunk = f"chunk-{len(self._chunks):05d}-{os.urandom(4).hex()}"
+        _write_atomic(os.path.join(self.directory, chunk + ".npy"), lambda f: np.save(f, X))
+        _write_atomic(os.path.join(self.directory, chunk + ".json"),
+                      lambda f: f.write(json.dumps(rows).encode()))
+        self._write_schema(self._chunks + [chunk])
+
+    def compact(self):
+        """Rewrites the store as a single chunk without superseded rows."""
+        if len(self._chunks) <= 1 and len(self._live) == sum(len(a) for a in self._arrays):
+            return
+        X, old = np.array(self.matrix()), list(self._chunks)
+        rows = {"filenames": list(self.filenames), "states": [self.states[f] for f in self.filenames]}
+        chunk = f"chunk-00000-{os.urandom(4).hex()}"
+        _write_atomic(os.path.join(self.directory, chunk + ".npy"), lambda f: np.save(f, X))
+        _write_atomic(os.path.join(self.directory, chunk + ".json"),
+                      lambda f: f.write(json.dumps(rows).encode()))
+        self._write_schema([chunk])
+        for name in old:
+            for suffix in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except OSError:
+                    pass
+
+    def _write_schema(self, chunks):
+        schema = {"version": STORE_VERSION, "columns": list(self.columns), "chunks": chunks}
+        _write_atomic(os.path.join(self.directory, _SCHEMA_FILE),
+                      lambda f: f.write(json.dumps(schema, indent=2).encode()))
+        self._chunks = chunks
+        self._load()
+
+    def update_from_audio(self, audio_data, chunk_size=1024, **kwargs):
+        """Extracts and appends ``extract_basic_features`` for new and changed tracks.
+
+        A track is extracted again when the size or mtime of its source file
+        differs from the one its row was extracted from. Tracks are looked up
+        and extracted one at a time, so an ``AudioCatalog`` keeps to its
+        memory budget; only the feature rows are collected per chunk.
+
+        Args:
+            audio_data (dict): ``Track`` records or an ``AudioCatalog``.
+            chunk_size (int): Number of tracks written per chunk.
+            **kwargs: Passed on to ``extract_basic_features``.
+
+        Returns:
+            int: Number of tracks added or refreshed.
+        """
+        from src.feature_extraction import extract_basic_features
+
+        stale = {}
+        for filename in audio_data:
+            state = _file_state(_source_path(audio_data, filename))
+            if filename not in self or (state is not None and self.states.get(filename) != state):
+                stale[filename] = state
+        filenames = list(stale)
+        for start in range(0, len(filenames), chunk_size):
+            features = {}
+            for filename in filenames[start:start + chunk_size]:
+                features.update(extract_basic_features({filename: audio_data[filename]}, **kwargs))
+            self.append(features, stale)
+        return len(filenames)
+
+    def export_compressed(self, path):
+        """Writes the live matrix, filenames, source states and columns to one compressed ``.npz`` archive."""
+        states = np.array([self.states[f] or [-1, -1] for f in self.filenames], dtype=np.int64).reshape(-1, 2)
+        np.savez_compressed(path, X=np.asarray(self.matrix()), filenames=np.array(self.filenames),
+                            columns=np.array(self.columns), states=states)
+
+    @classmethod
+    def import_compressed(cls, path, directory):
+        """Creates (or extends) a store from an archive written by ``export_compressed``."""
+        with np.load(path) as archive:
+            store = cls(directory, columns=archive["columns"].tolist())
+            states = None
+            if "states" in archive.files:
+                states = [None if size < 0 else [size, mtime_ns] for size, mtime_ns in archive["states"].tolist()]
+            store.append_rows(archive["filenames"].tolist(), archive["X"], states)
+        return store
@@ -1,39 +1,60 @@
 import json
+from src.model_training import train_model, update_model
+from src import feedback_store
 
-def incorporate_feedback_into_training(feature_data, labels, feedback_file="feedback.json"):
+# Suggestion types whose poor ratings adjust the training labels
+ADJUSTED_TYPES = ('action', 'cut')
+
+def incorporate_feedback_into_training(feature_data, labels, feedback_file="feedback.db",
+                                       model=None, drift_threshold=0.7, max_unseen=0.2):
     """Incorporates user feedback into the training process to refine the model.
 
+    A store that does not exist yet is first filled from the legacy JSONL
+    file next to it (``feedback.json`` for ``feedback.db``), if there is one.
+
     Args:
         feature_data (dict): Dictionary of features where keys are filenames.
         labels (dict): Dictionary of labels corresponding to the features.
-        feedback_file (str): Path to the file containing user feedback.
+        feedback_file (str): Path to the feedback store (or a legacy JSONL file).
+        model: Previously trained ensemble to update incrementally; None retrains from scratch.
+        drift_threshold (float): Accuracy on the adjusted labels below which the
+            incremental update falls back to a full retraining.
+        max_unseen (float): Share of training rows whose adjusted label the model
+            has never seen above which the update falls back to a full retraining.
 
     Returns:
         model: Retrained machine learning model.
     """
-    feedback = []
-    try:
-        with open(feedback_file, 'r') as f:
-            feedback = [json.loads(line) for line in f]
-    except Exception as e:
-        print(f"Error loading feedback: {e}")
+    if feedback_store.is_store_path(feedback_file):
+        # Poor ratings are pre-aggregated per track, so no entry is re-read here
+        try:
+            feedback_store.import_legacy(feedback_file)
+            ratings = feedback_store.track_ratings(feedback_file, ADJUSTED_TYPES)
+        except Exception as e:
+            print(f"Error loading feedback: {e}")
+            ratings = {}
+        for track_name, aggregate in ratings.items():
+            if aggregate['penalty']:
+                labels[track_name] -= aggregate['penalty']  # Example adjustment logic
+    else:
+        for entry in load_feedback(feedback_file):
+            track_name = entry['track_name']
+            rating = entry['rating']
+
+            if rating >= 4:
+                continue  # Good ratings, no need to change
+
+            if entry['suggestion_type'] == 'action':
+                # Adjust labels or features for this track/effect based on poor feedback
+                labels[track_name] -= (5 - rating)  # Example adjustment logic
+            elif entry['suggestion_type'] == 'cut':
+                # Adjust labels or features for this track/cut based on poor feedback
+                labels[track_name] -= (5 - rating)  # Example adjustment logic
 
-    # Adjust labels based on feedback
-    for entry in feedback:
-        track_name = entry['track_name']
-        rating = entry['rating']
-        
-        if rating >= 4:
-            continue  # Good ratings, no need to change
-
-        if entry['suggestion_type'] == 'action':
-            # Adjust labels or features for this track/effect based on poor feedback
-            labels[track_name] -= (5 - rating)  # Example adjustment logic
-        elif entry['suggestion_type'] == 'cut':
-            # Adjust labels or features for this track/cut based on poor feedback
-            labels[track_name] -= (5 - rating)  # Example adjustment logic
-    
     # Retrain the model with updated labels/feature data
+    if model is not None:
+        return update_model(model, feature_data, labels, drift_threshold=drift_threshold,
+                            max_unseen=max_unseen)
     model = train_model(feature_data, labels)
     return model
 
@@ -81,17 +102,49 @@ def collect_user_feedback(suggested_actions, suggested_cuts):
 
     return feedback
 
-def save_feedback(feedback, filename="feedback.json"):
-    """Saves user feedback to a JSON file.
+def save_feedback(feedback, filename="feedback.db"):
+    """Saves user feedback to the feedback store.
+
+    Files ending in ``.db``, ``.sqlite`` or ``.sqlite3`` are SQLite stores
+    (see ``src.feedback_store``); any other name is appended to as JSON lines.
+    A new store first imports the legacy JSONL file next to it, if any.
 
     Args:
         feedback (list): List of feedback entries.
         filename (str): The name of the file where feedback will be saved.
     """
     try:
-        with open(filename, 'a') as f:
-            for entry in feedback:
-                f.write(json.dumps(entry) + "\n")
+        if feedback_store.is_store_path(filename):
+            feedback_store.import_legacy(filename)
+            feedback_store.insert_feedback(filename, feedback)
+        else:
+            with open(filename, 'a') as f:
+                for entry in feedback:
+                    f.write(json.dumps(entry) + "\n")
         print(f"Feedback saved to {filename}")
     except Exception as e:
         print(f"Error saving feedback: {e}")
+
+def load_feedback(filename="feedback.db", track_name=None, suggestion_type=None):
+    """Loads saved user feedback.
+
+    Args:
+        filename (str): Feedback store or legacy JSONL file.
+        track_name (str): Only return entries for this track.
+        suggestion_type (str): Only return entries of this type ("action" or "cut").
+
+    Returns:
+        list: A list of feedback entries, or an empty list if the file cannot be read.
+    """
+    try:
+        if feedback_store.is_store_path(filename):
+            feedback_store.import_legacy(filename)
+            return feedback_store.load_feedback(filename, track_name, suggestion_type)
+        with open(filename, 'r') as f:
+            feedback = [json.loads(line) for line in f]
+    except Exception as e:
+        print(f"Error loading feedback: {e}")
+        return []
+    return [entry for entry in feedback
+            if (track_name is None or entry['track_name'] == track_name)
+            and (suggestion_type is None or entry['suggestion_type'] == suggestion_type)]
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    track_name TEXT NOT NULL,
+    suggestion_type TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_track ON feedback (track_name);
+CREATE INDEX IF NOT EXISTS idx_feedback_type ON feedback (suggestion_type);
+CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at);
+CREATE TABLE IF NOT EXISTS track_ratings (
+    track_name TEXT NOT NULL,
+    suggestion_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    rating_sum INTEGER NOT NULL,
+    penalty INTEGER NOT NULL,
+    PRIMARY KEY (track_name, suggestion_type)
+);
+"""
+
+_UPSERT_RATING = """
+INSERT INTO track_ratings (track_name, suggestion_type, count, rating_sum, penalty)
+VALUES (?, ?, 1, ?, ?)
+ON CONFLICT (track_name, suggestion_type) DO UPDATE SET
+    count = count + 1,
+    rating_sum = rating_sum + excluded.rating_sum,
+    penalty = penalty + excluded.penalty
+"""
+
+def is_store_path(path):
+    """Returns True if ``path`` names an SQLite feedback store rather than a JSONL file."""
+    return str(path).endswith(SQLITE_SUFFIXES)
+
+def legacy_path(path):
+    """Returns the JSONL file a store replaces: the same name with a ``.json`` suffix."""
+    return os.path.splitext(str(path))[0] + ".json"
+
+def import_legacy(path):
+    """Imports the legacy JSONL file next to a store on first use.
+
+    Nothing happens once the store exists, so the import runs at most once
+    and the JSONL file is left in place.
+
+    Args:
+        path (str): Path to the SQLite database file.
+
+    Returns:
+        int: Number of entries imported.
+    """
+    legacy = legacy_path(path)
+    if os.path.exists(path) or not os.path.exists(legacy):
+        return 0
+    return import_jsonl(legacy, path)
+
+def rating_penalty(rating):
+    """Returns the label adjustment for one rating (poor ratings below 4 lower the label)."""
+    return 0 if rating >= 4 else 5 - rating
+
+def connect(path):
+    """Opens (and if needed creates) a feedback store.
+
+    Args:
+        path (str): Path to the SQLite database file.
+
+    Returns:
+        sqlite3.Connection: Open connection with the schema in place.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def insert_feedback(path, feedback, batch_size=10000):
+    """Appends feedback entries in batched transactions and updates per-track aggregates.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        feedback (iterable): Feedback entries (dicts with track_name, suggestion_type and rating).
+        batch_size (int): Number of entries written per transaction.
+
+    Returns:
+        int: Number of entries written.
+    """
+    conn = connect(path)
+    written = 0
+    try:
+        batch = []
+        for entry in feedback:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                written += _write_batch(conn, batch)
+                batch = []
+        if batch:
+            written += _write_batch(conn, batch)
+    finally:
+        conn.close()
+    return written
+
+def _write_batch(conn, batch):
+    now = time.time()
+    rows = [(e['track_name'], e['suggestion_type'], int(e['rating']), e.get('created_at', now),
+             json.dumps(e)) for e in batch]
+    with conn:
+        conn.executemany(
+            "INSERT INTO feedback (track_name, suggestion_type, rating, created_at, payload) "
+            "VALUES (?, ?, ?, ?, ?)", rows)
+        conn.executemany(_UPSERT_RATING, [(track, kind, rating, rating_penalty(rating))
+                                          for track, kind, rating, _, _ in rows])
+    return len(rows)
+
+def load_feedback(path, track_name=None, suggestion_type=None, since=None):
+    """Reads feedback entries, optionally filtered through the store's indexes.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        track_name (str): Only return entries for this track.
+        suggestion_type (str): Only return entries of this type ("action" or "cut").
+        since (float): Only return entries created at or after this Unix timestamp.
+
+    Returns:
+        list: Feedback entries as dictionaries, oldest first.
+    """
+    clauses, params = [], []
+    for column, value, op in (("track_name", track_name, "="),
+                              ("suggestion_type", suggestion_type, "="),
+                              ("created_at", since, ">=")):
+        if value is not None:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    query = "SELECT payload FROM feedback"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    conn = connect(path)
+    try:
+        return [json.loads(payload) for (payload,) in conn.execute(query + " ORDER BY id", params)]
+    finally:
+        conn.close()
+
+def track_ratings(path, suggestion_type=None):
+    """Returns the incrementally maintained per-track rating aggregates.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        suggestion_type (str): Only aggregate ratings of this type (or of a
+            sequence of types); None combines all types.
+
+    Returns:
+        dict: Track name to {"count", "mean_rating", "penalty"}, where ``penalty``
+        is the total label adjustment implied by poor ratings.
+    """
+    types = [suggestion_type] if isinstance(suggestion_type, str) else list(suggestion_type or ())
+    query = ("SELECT track_name, SUM(count), SUM(rating_sum), SUM(penalty) FROM track_ratings"
+             + (f" WHERE suggestion_type IN ({', '.join('?' * len(types))})" if types else "")
+             + " GROUP BY track_name")
+    conn = connect(path)
+    try:
+        rows = conn.execute(query, types).fetchall()
+    finally:
+        conn.close()
+    return {track: {"count": count, "mean_rating": rating_sum / count, "penalty": penalty}
+            for track, count, rating_sum, penalty in rows}
+
+def import_jsonl(jsonl_path, db_path, batch_size=10000):
+    """One-time import of a legacy append-only JSONL feedback file into a store.
+
+    Args:
+        jsonl_path (str): Path to the JSONL feedback file.
+        db_path (str): Path to the SQLite database file.
+        batch_size (int): Number of entries written per transaction.
+
+    Returns:
+        int: Number of entries imported.
+    """
+    with open(jsonl_path, 'r') as f:
+        return insert_feedback(db_path, (json.loads(line) for line in f if line.strip()), batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a JSONL feedback log into an SQLite feedback store.")
+    parser.add_argument("jsonl_path", help="Legacy feedback file (one JSON entry per line)")
+    parser.add_argument("db_path", help="SQLite feedback store to create or extend")
+    args = parser.parse_args()
+    count = import_jsonl(args.jsonl_path, args.db_path)
+    print(f"Imported {count} feedback entries into {args.db_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,185 @@
 # inference.py
+import time
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
 import numpy as np
 import joblib
 from src.feature_extraction import extract_basic_features
-from src.action_suggestion import suggest_actions, suggest_cuts
+from src.action_suggestion import (cuts_from_predictions, feature_matrix, predict_labels,
+                                   timed_cuts_from_candidates, track_cut_candidates)
+from src.model_export import MANIFEST, is_compact_model, load_compact_model
+from src.profiling import profiled, span
 
+@profiled()
 def load_model(model_path):
     """Load the pre-trained machine learning model.
 
+    A directory written by ``export_model`` is loaded as a memory-mapped
+    ``CompactModel``, which needs neither scikit-learn nor TensorFlow.
+
     Args:
-        model_path (str): Path to the pre-trained model file.
+        model_path (str): Path to the pre-trained model file or compact model directory.
 
     Returns:
         model: The loaded model object.
     """
+    if os.path.isdir(model_path) and is_compact_model(model_path):
+        return load_compact_model(model_path)
     return joblib.load(model_path)
 
-def predict_actions(model, audio_data):
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+def get_model(model_path, max_models=4):
+    """Returns a loaded model, reusing a cached copy while the file is unchanged.
+
+    Models are cached by path, modification time and size, so rewriting the
+    file triggers a reload on the next call. At most ``max_models`` versions
+    are kept, least recently used first out.
+
+    Args:
+        model_path (str): Path to the pre-trained model file.
+        max_models (int): Maximum number of cached models.
+
+    Returns:
+        model: The loaded model object.
+    """
+    path = os.path.abspath(model_path)
+    stat = os.stat(os.path.join(path, MANIFEST) if os.path.isdir(path) else path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _model_cache_lock:
+        if key in _model_cache:
+            _model_cache.move_to_end(key)
+            return _model_cache[key]
+
+    model = load_model(path)
+    with _model_cache_lock:
+        for stale in [k for k in _model_cache if k[0] == path]:
+            del _model_cache[stale]
+        _model_cache[key] = model
+        while len(_model_cache) > max_models:
+            _model_cache.popitem(last=False)
+    return model
+
+def to_jsonable(value):
+    """Recursively converts numpy values in suggestions into JSON-serialisable types."""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def predict_actions(model, audio_data, batch_size=1024, cascade_threshold=None, cascade_stats=None,
+                    cascade_audit=False, timed_cuts=True):
     """Predicts the actions and cuts for the given audio data.
 
+    Actions come from one prediction per track. Cuts are placed at
+    beat-aligned windows scored in one batched call (see
+    ``suggest_timed_cuts``), or with ``timed_cuts=False`` derived from the
+    whole-track predictions as fixed suggestions. Timed cuts share one STFT
+    per track with the whole-track features. With ``cascade_threshold``
+    set, the ensemble's random forest scores every track and cut window, and
+    only those it is less confident about go through the full ensemble (see
+    ``cascade_predict``). ``cascade_stats`` covers the tracks only.
+
     Args:
         model: The pre-trained machine learning model.
         audio_data (dict): Dictionary where keys are filenames and values are audio data.
+        batch_size (int): Maximum number of tracks per model call.
+        cascade_threshold (float): First-stage confidence needed to skip the full ensemble.
+        cascade_stats (dict): Updated in place with escalation (and audit) metrics.
+        cascade_audit (bool): Also run the full ensemble on every track to measure agreement.
+        timed_cuts (bool): Suggest cuts at concrete positions instead of the fixed placeholders.
 
     Returns:
         dict: Suggested actions and cuts for each audio file.
     """
-    features = extract_basic_features(audio_data)
-    suggested_actions = suggest_actions(model, features)
-    suggested_cuts = suggest_cuts(model, features)
+    with span("inference.features"):
+        if timed_cuts:
+            candidates = track_cut_candidates(audio_data)
+            features = {filename: c["features"] for filename, c in candidates.items()}
+        else:
+            features = extract_basic_features(audio_data)
+    with span("inference.predict"):
+        filenames, X = feature_matrix(features)
+        predictions = predict_labels(model, X, batch_size, cascade_threshold, cascade_stats, cascade_audit)
+    suggested_actions = dict(zip(filenames, predictions))
+    with span("inference.suggest_cuts"):
+        if timed_cuts:
+            suggested_cuts = timed_cuts_from_candidates(model, candidates, batch_size=batch_size,
+                                                        cascade_threshold=cascade_threshold)
+        else:
+            suggested_cuts = cuts_from_predictions(filenames, predictions)
     
     return suggested_actions, suggested_cuts
 
-def run_inference(model_path, audio_data):
+@profiled()
+def run_inference(model_path, audio_data, cascade_threshold=None):
     """Run the inference process on the provided audio data.
 
     Args:
         model_path (str): Path to the pre-trained model file.
         audio_data (dict): Dictionary where keys are filenames and values are audio data.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
 
     Returns:
         dict: Suggested actions and cuts for each audio file.
     """
-    model = load_model(model_path)
-    return predict_actions(model, audio_data)
+    model = get_model(model_path)
+    return predict_actions(model, audio_data, cascade_threshold=cascade_threshold)
+
+def main():
+    """Inference-only command line entry point.
+
+    Only the libraries needed to decode audio, extract features and unpickle
+    the model are imported; TensorFlow is loaded only if the pickled model
+    itself references it. Startup timings are reported on stderr.
+    """
+    imports_done = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Suggest actions and cuts for a directory of audio files.")
+    parser.add_argument("model_path", help="Path to the pre-trained model file")
+    parser.add_argument("audio_dir", help="Directory of .wav files to analyse")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of decoding processes")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Maximum tracks per model call")
+    parser.add_argument("--output", help="Write suggestions as JSON to this file instead of stdout")
+    parser.add_argument("--cascade-threshold", type=float,
+                        help="Only send tracks below this random-forest confidence to the full ensemble")
+    parser.add_argument("--cascade-audit", action="store_true",
+                        help="Also run the full ensemble on every track and report agreement")
+    args = parser.parse_args()
+
+    from src.data_processing import load_audio_files
+
+    model = get_model(args.model_path)
+    model_loaded = time.perf_counter()
+    print(f"startup: imports {1000 * (imports_done - _IMPORT_START):.0f} ms, "
+          f"model load {1000 * (model_loaded - imports_done):.0f} ms, "
+          f"tensorflow loaded: {'tensorflow' in sys.modules}", file=sys.stderr)
+
+    audio_data = load_audio_files(args.audio_dir, n_jobs=args.n_jobs)
+    cascade_stats = {}
+    suggested_actions, suggested_cuts = predict_actions(model, audio_data, args.batch_size,
+                                                        args.cascade_threshold, cascade_stats,
+                                                        args.cascade_audit)
+    if cascade_stats:
+        print("cascade: " + ", ".join(f"{k} {v:.3g}" for k, v in cascade_stats.items()), file=sys.stderr)
+
+    results = to_jsonable({"actions": suggested_actions, "cuts": suggested_cuts})
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# inference_server.py
+import argparse
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.data_processing import load_track
+from src.inference import get_model, predict_actions, to_jsonable
+
+class MicroBatcher:
+    """Merges concurrent prediction requests into single ``predict_actions`` calls.
+
+    A background thread waits for a first request, keeps collecting for up to
+    ``max_wait`` seconds or ``max_batch`` requests, then runs one prediction
+    per model path and hands each request its own slice of the results.
+
+    Args:
+        max_batch (int): Maximum number of requests merged into one call.
+        max_wait (float): Seconds to wait for more requests after the first one.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
+    """
+
+    def __init__(self, max_batch=32, max_wait=0.005, cascade_threshold=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cascade_threshold = cascade_threshold
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, model_path, audio_data):
+        """Queues a request and returns a future resolving to (actions, cuts)."""
+        future = Future()
+        self._queue.put((model_path, audio_data, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            by_model = {}
+            for request in batch:
+                by_model.setdefault(request[0], []).append(request)
+            for model_path, requests in by_model.items():
+                self._predict(model_path, requests)
+
+    def _predict(self, model_path, requests):
+        merged = {}
+        for index, (_, audio_data, _) in enumerate(requests):
+            for filename, track in audio_data.items():
+                merged[(index, filename)] = track
+        try:
+            actions, cuts = predict_actions(get_model(model_path), merged,
+                                            cascade_threshold=self.cascade_threshold)
+        except Exception as e:
+            for _, _, future in requests:
+                future.set_exception(e)
+            return
+        for index, (_, audio_data, future) in enumerate(requests):
+            future.set_result((
+                {filename: actions[(index, filename)] for filename in audio_data},
+                {filename: cuts[(index, filename)] for filename in audio_data},
+            ))
+
+def make_handler(default_model_path, batcher, timeout=60, allowed_models=()):
+    """Builds the HTTP request handler class bound to a model path and batcher.
+
+    Requests may only name ``default_model_path`` or one of ``allowed_models``:
+    loading a model unpickles it, so clients must not choose arbitrary files.
+    """
+    allowed = {os.path.realpath(path) for path in (default_model_path, *allowed_models)}
+
+    class InferenceHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                model_path = request.get("model_path", default_model_path)
+                if os.path.realpath(model_path) not in allowed:
+                    self._send_json(403, {"error": f"model {model_path!r} is not served"})
+                    return
+                audio_data = {path: load_track(path, sr=request.get("sr"))
+                              for path in request.get("files", [])}
+                actions, cuts = batcher.submit(model_path, audio_data).result(timeout)
+            except Exception as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, to_jsonable({"actions": actions, "cuts": cuts}))
+
+        def log_message(self, format, *args):
+            pass
+
+    return InferenceHandler
+
+def serve(model_path, host="127.0.0.1", port=8765, max_batch=32, max_wait=0.005, cascade_threshold=None,
+          allowed_models=()):
+    """Runs a resident inference server until interrupted.
+
+    The model is loaded once up front and kept warm; it is reloaded
+    automatically when the file on disk changes. ``POST /predict`` takes a
+    JSON body ``{"files": [...], "model_path": ..., "sr": ...}`` and returns
+    ``{"actions": {...}, "cuts": {...}}``. ``model_path`` is optional and
+    must be the served model or one of ``allowed_models``; other paths are
+    refused with status 403.
+
+    Args:
+        model_path (str): Path to the default pre-trained model file.
+        host (str): Interface to bind.
+        port (int): Port to listen on.
+        max_batch (int): Maximum number of requests merged into one prediction.
+        max_wait (float): Seconds to wait for more requests before predicting.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
+        allowed_models (list): Further model paths requests may select.
+    """
+    get_model(model_path)
+    batcher = MicroBatcher(max_batch=max_batch, max_wait=max_wait, cascade_threshold=cascade_threshold)
+    server = ThreadingHTTPServer((host, port), make_handler(model_path, batcher, allowed_models=allowed_models))
+    print(f"Serving {model_path} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident inference server with a warm model cache.")
+    parser.add_argument("model_path", help="Path to the pre-trained model file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--cascade-threshold", type=float,
+                        help="Only send tracks below this random-forest confidence to the full ensemble")
+    parser.add_argument("--allow-model", action="append", default=[], metavar="PATH",
+                        help="Another model path requests may select (repeatable)")
+    args = parser.parse_args()
+    serve(args.model_path, args.host, args.port, args.max_batch, args.max_wait_ms / 1000.0,
+          args.cascade_threshold, args.allow_model)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# manifest.py
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from src.feature_cache import FEATURE_VERSION, file_digest
+
+DEFAULT_MANIFEST_NAME = ".ingest_manifest.db"
+
+# Seconds a drop-folder file must go unmodified before it is analysed, so
+# files still being copied in are not processed (and recorded) half-written.
+DEFAULT_SETTLE = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    feature_version INTEGER NOT NULL,
+    model_version TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    results TEXT NOT NULL
+);
+"""
+
+_UPSERT_FILE = """
+INSERT INTO files (filename, size, mtime_ns, digest, feature_version, model_version, processed_at, results)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (filename) DO UPDATE SET
+    size = excluded.size,
+    mtime_ns = excluded.mtime_ns,
+    digest = excluded.digest,
+    feature_version = excluded.feature_version,
+    model_version = excluded.model_version,
+    processed_at = excluded.processed_at,
+    results = excluded.results
+"""
+
+_model_versions = {}
+
+def model_version(model_path):
+    """Returns a content hash identifying a model file or compact model directory.
+
+    The hash is cached by path, modification time and size, so polling does
+    not re-read an unchanged model.
+    """
+    from src.model_export import MANIFEST
+
+    path = os.path.join(model_path, MANIFEST) if os.path.isdir(model_path) else model_path
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _model_versions:
+        _model_versions[key] = file_digest(path)
+    return _model_versions[key]
+
+class IngestionManifest:
+    """Records which audio files of a directory were analysed, and with what result.
+
+    Every processed file has a row holding its size, modification time,
+    content hash, the ``FEATURE_VERSION`` and model version used, and the
+    suggestions produced. A file counts as unchanged while its size and
+    mtime match. A file whose mtime changed but whose content did not (for
+    example after ``touch``) is recognised by its hash.
+
+    Args:
+        path (str): Path to the SQLite manifest file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def scan(self, directory, model_version, settle=DEFAULT_SETTLE):
+        """Splits the ``.wav`` files of a directory into pending and up-to-date ones.
+
+        Rows of files that disappeared from the directory are dropped. Each
+        pending file's size, mtime and hash are taken here, before it is
+        decoded, and ``record`` stores this snapshot. A file that changes
+        while it is being analysed therefore no longer matches its row and
+        is processed again on the next scan.
+
+        Args:
+            directory (str): Directory to scan.
+            model_version (str): Version of the model the results must come from.
+            settle (float): Skip files modified less than this many seconds ago
+                (they may still be being copied in).
+
+        Returns:
+            tuple: (pending, cached) where pending maps the filenames to
+            process to their (size, mtime_ns, digest) snapshot and cached maps
+            the other filenames to their stored results.
+        """
+        rows = {row[0]: row for row in self.conn.execute(
+            "SELECT filename, size, mtime_ns, digest, feature_version, model_version, results FROM files")}
+        pending, cached, present = {}, {}, set()
+        now = time.time()
+        for filename in sorted(f for f in os.listdir(directory) if f.endswith('.wav')):
+            present.add(filename)
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            if settle and now - stat.st_mtime < settle:
+                continue
+            row = rows.get(filename)
+            if row is not None and row[4] == FEATURE_VERSION and row[5] == model_version:
+                if (row[1], row[2]) == (stat.st_size, stat.st_mtime_ns):
+                    cached[filename] = json.loads(row[6])
+                    continue
+                digest = file_digest(path) if row[1] == stat.st_size else None
+                if digest == row[3]:
+                    with self.conn:
+                        self.conn.execute("UPDATE files SET mtime_ns = ? WHERE filename = ?",
+                                          (stat.st_mtime_ns, filename))
+                    cached[filename] = json.loads(row[6])
+                    continue
+            pending[filename] = (stat.st_size, stat.st_mtime_ns, file_digest(path))
+
+        missing = [(filename,) for filename in rows if filename not in present]
+        if missing:
+            with self.conn:
+                self.conn.executemany("DELETE FROM files WHERE filename = ?", missing)
+        return pending, cached
+
+    def record(self, results, model_version, snapshots):
+        """Stores the results of newly processed files in one transaction.
+
+        Args:
+            results (dict): Filename to JSON-serialisable results.
+            model_version (str): Version of the model that produced the results.
+            snapshots (dict): Filename to the (size, mtime_ns, digest) taken by
+                ``scan`` before the file was analysed.
+        """
+        now = time.time()
+        rows = []
+        for filename, result in results.items():
+            size, mtime_ns, digest = snapshots[filename]
+            rows.append((filename, size, mtime_ns, digest, FEATURE_VERSION, model_version, now,
+                         json.dumps(result)))
+        with self.conn:
+            self.conn.executemany(_UPSERT_FILE, rows)
+
+def process_new_audio(directory, model_path, manifest_path=None, n_jobs=1, batch_size=1024,
+                      cascade_threshold=None, chunk_size=256, settle=DEFAULT_SETTLE, version=None):
+    """Suggests actions and cuts for a drop folder, only analysing new or changed files.
+
+    Pending files stream through ``iter_pipelined``. Results are committed to
+    the manifest every ``chunk_size`` files, so an interrupted run resumes
+    close to where it stopped. Up-to-date files reuse their stored
+    suggestions. A new model or ``FEATURE_VERSION`` invalidates every entry.
+    By default the model version is a hash of the model file, so every
+    retrain re-analyses the whole folder; pass ``version`` to keep stored
+    suggestions across retrains until the version is changed.
+
+    Args:
+        directory (str): Directory of ``.wav`` files.
+        model_path (str): Path to the pre-trained model file or compact model directory.
+        manifest_path (str): Manifest location; defaults to a hidden file in ``directory``.
+        n_jobs (int): Number of decoding processes.
+        batch_size (int): Maximum tracks per model call.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
+        chunk_size (int): Number of results committed to the manifest at a time.
+        settle (float): Skip files modified less than this many seconds ago
+            (they are picked up by a later call).
+        version (str): Explicit model version to key stored suggestions on
+            (defaults to ``model_version(model_path)``).
+
+    Returns:
+        tuple: (actions, cuts, processed) with suggestions for every file and
+        the list of filenames analysed in this call.
+    """
+    from src.inference import get_model, to_jsonable
+    from src.pipeline import iter_pipelined
+
+    manifest = IngestionManifest(manifest_path or os.path.join(directory, DEFAULT_MANIFEST_NAME))
+    try:
+        version = version or model_version(model_path)
+        pending, cached = manifest.scan(directory, version, settle=settle)
+        results = dict(cached)
+        fresh = {}
+        if pending:
+            stream = iter_pipelined(directory, get_model(model_path), n_decoders=n_jobs, batch_size=batch_size,
+                                    cascade_threshold=cascade_threshold, filenames=list(pending))
+            for filename, action, cuts in stream:
+                fresh[filename] = to_jsonable({"actions": action, "cuts": cuts})
+                if len(fresh) >= chunk_size:
+                    manifest.record(fresh, version, pending)
+                    results.update(fresh)
+                    fresh = {}
+        manifest.record(fresh, version, pending)
+        results.update(fresh)
+    finally:
+        manifest.close()
+
+    filenames = sorted(results)
+    return ({f: results[f]["actions"] for f in filenames},
+            {f: results[f]["cuts"] for f in filenames},
+            list(pending))
+
+def watch(directory, model_path, interval=5.0, settle=DEFAULT_SETTLE, callback=None, max_polls=None, **kwargs):
+    """Polls a drop folder and processes files as they land.
+
+    Args:
+        directory (str): Directory of ``.wav`` files.
+        model_path (str): Path to the pre-trained model file or compact model directory.
+        interval (float): Seconds between polls.
+        settle (float): Wait until a file has been unmodified this long before processing it.
+        callback (callable): Called with ``{filename: {"actions": ..., "cuts": ...}}``
+            for the files processed in each poll.
+        max_polls (int): Stop after this many polls (None polls forever).
+        **kwargs: Passed on to ``process_new_audio``.
+    """
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        actions, cuts, processed = process_new_audio(directory, model_path, settle=settle, **kwargs)
+        if processed and callback is not None:
+            callback({f: {"actions": actions[f], "cuts": cuts[f]} for f in processed})
+        polls += 1
+        if max_polls is None or polls < max_polls:
+            time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse new or changed files of a drop folder.")
+    parser.add_argument("audio_dir", help="Directory of .wav files")
+    parser.add_argument("model_path", help="Path to the pre-trained model file or compact model directory")
+    parser.add_argument("--manifest", help="Manifest path (default: a hidden file in audio_dir)")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of decoding processes")
+    parser.add_argument("--watch", action="store_true", help="Keep polling and process files as they land")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls in watch mode")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help="Skip files modified less than this many seconds ago")
+    parser.add_argument("--model-version",
+                        help="Key stored suggestions on this version instead of a hash of the model")
+    args = parser.parse_args()
+
+    def emit(results):
+        for filename, result in results.items():
+            print(json.dumps({"filename": filename, **result}), flush=True)
+
+    if not args.watch:
+        actions, cuts, processed = process_new_audio(args.audio_dir, args.model_path, args.manifest, args.n_jobs,
+                                                     settle=args.settle, version=args.model_version)
+        emit({f: {"actions": actions[f], "cuts": cuts[f]} for f in processed})
+        print(f"{len(processed)} processed, {len(actions) - len(processed)} unchanged", file=sys.stderr)
+        return
+    try:
+        watch(args.audio_dir, args.model_path, args.interval, args.settle, callback=emit,
+              manifest_path=args.manifest, n_jobs=args.n_jobs, version=args.model_version)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
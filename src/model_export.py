@@ -0,0 +1,337 @@
+# model_export.py
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from src.profiling import profiled
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+def _export_forest(forest, arrays, prefix):
+    """Flattens every tree of a random forest into shared node arrays."""
+    n_classes = len(forest.classes_)
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    for tree in forest.estimators_:
+        t = tree.tree_
+        roots.append(offset)
+        is_leaf = t.children_left == -1
+        left.append(np.where(is_leaf, -1, t.children_left + offset))
+        right.append(np.where(is_leaf, -1, t.children_right + offset))
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(t.threshold)
+        proba = t.value[:, 0, :n_classes].astype(np.float64)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(proba / normalizer)
+        offset += t.node_count
+    arrays[prefix + "roots"] = np.array(roots, dtype=np.int64)
+    arrays[prefix + "left"] = np.concatenate(left).astype(np.int64)
+    arrays[prefix + "right"] = np.concatenate(right).astype(np.int64)
+    arrays[prefix + "feature"] = np.concatenate(feature).astype(np.int64)
+    arrays[prefix + "threshold"] = np.concatenate(threshold)
+    arrays[prefix + "value"] = np.concatenate(value)
+    return {"kind": "forest", "prefix": prefix, "classes": forest.classes_.tolist()}
+
+def _export_svc(svc, arrays, prefix):
+    """Stores the support vectors, dual coefficients and Platt scaling of an SVC."""
+    if len(getattr(svc, "probA_", [])) == 0:
+        raise ValueError("Only SVC models fitted with probability=True can be exported")
+    arrays[prefix + "support_vectors"] = np.asarray(svc.support_vectors_, dtype=np.float64)
+    arrays[prefix + "dual_coef"] = np.asarray(svc._dual_coef_, dtype=np.float64)
+    arrays[prefix + "intercept"] = np.asarray(svc._intercept_, dtype=np.float64)
+    arrays[prefix + "prob_a"] = np.asarray(svc.probA_, dtype=np.float64)
+    arrays[prefix + "prob_b"] = np.asarray(svc.probB_, dtype=np.float64)
+    arrays[prefix + "n_support"] = np.asarray(svc.n_support_, dtype=np.int64)
+    return {"kind": "svc", "prefix": prefix, "classes": svc.classes_.tolist(),
+            "kernel": svc.kernel, "gamma": float(svc._gamma), "coef0": float(svc.coef0),
+            "degree": int(svc.degree)}
+
+def _export_keras(keras_classifier, arrays, prefix):
+    """Stores the layer configuration and weights of a Keras classifier's network."""
+    layers = []
+    for index, layer in enumerate(keras_classifier.model.layers):
+        config = layer.get_config()
+        kind = type(layer).__name__
+        spec = {"type": kind}
+        if kind in ("Conv1D", "Dense"):
+            kernel, bias = layer.get_weights()
+            arrays[f"{prefix}{index}.kernel"] = kernel.astype(np.float32)
+            arrays[f"{prefix}{index}.bias"] = bias.astype(np.float32)
+            spec.update(activation=config["activation"], weights=f"{prefix}{index}")
+            if kind == "Conv1D":
+                if config["padding"] != "valid" or config["dilation_rate"] not in ((1,), [1], 1):
+                    raise ValueError("Only valid, undilated Conv1D layers can be exported")
+                spec["strides"] = int(np.ravel(config["strides"])[0])
+        elif kind == "MaxPooling1D":
+            if config["padding"] != "valid":
+                raise ValueError("Only valid MaxPooling1D layers can be exported")
+            spec.update(pool_size=int(np.ravel(config["pool_size"])[0]),
+                        strides=int(np.ravel(config["strides"] or config["pool_size"])[0]))
+        elif kind == "Reshape":
+            spec["target_shape"] = list(config["target_shape"])
+        elif kind not in ("Flatten", "Dropout", "InputLayer"):
+            raise ValueError(f"Unsupported Keras layer for export: {kind}")
+        layers.append(spec)
+    return {"kind": "keras", "prefix": prefix, "classes": np.asarray(keras_classifier.classes_).tolist(),
+            "layers": layers}
+
+def _export_member(estimator, arrays, prefix):
+    kind = type(estimator).__name__
+    if kind == "RandomForestClassifier":
+        return _export_forest(estimator, arrays, prefix)
+    if kind == "SVC":
+        return _export_svc(estimator, arrays, prefix)
+    if hasattr(estimator, "build_fn"):
+        return _export_keras(estimator, arrays, prefix)
+    raise ValueError(f"Unsupported estimator for export: {kind}")
+
+@profiled()
+def export_model(model, directory):
+    """Exports a trained model to a compact, array-backed directory.
+
+    Supported models are the soft-voting ensemble from ``train_model`` and
+    plain random forests or probability-enabled SVCs. Trees become flat node
+    arrays, the SVM keeps its support vectors and Platt-scaling coefficients,
+    and the CNN keeps its layer weights. Each array is its own ``.npy`` file,
+    so ``load_compact_model`` can memory-map it. The export is written to a
+    temporary directory and swapped in whole.
+
+    Args:
+        model: Trained model.
+        directory (str): Output directory (replaced if it exists).
+
+    Returns:
+        str: The output directory.
+    """
+    arrays = {}
+    if type(model).__name__ == "VotingClassifier":
+        if model.voting != "soft":
+            raise ValueError("Only soft-voting ensembles can be exported")
+        members = [dict(_export_member(estimator, arrays, f"{name}."), name=name)
+                   for name, estimator in zip(model.named_estimators_, model.estimators_)]
+        weights = None if model.weights is None else [float(w) for w in model.weights]
+        manifest = {"kind": "voting", "members": members, "weights": weights}
+    else:
+        manifest = {"kind": "single", "members": [dict(_export_member(model, arrays, "model."), name="model")],
+                    "weights": None}
+    manifest.update(format_version=FORMAT_VERSION, classes=np.asarray(model.classes_).tolist())
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".export-")
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, name + ".npy"), array)
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+    return directory
+
+def _forest_proba(arrays, prefix, X):
+    left, right = arrays[prefix + "left"], arrays[prefix + "right"]
+    feature, threshold = arrays[prefix + "feature"], arrays[prefix + "threshold"]
+    X = np.asarray(X, dtype=np.float32)  # scikit-learn compares float32 features to the thresholds
+    node = np.broadcast_to(arrays[prefix + "roots"], (len(X), len(arrays[prefix + "roots"]))).copy()
+    rows = np.arange(len(X))[:, None]
+    internal = left[node] != -1
+    while internal.any():
+        r, t = np.nonzero(internal)
+        current = node[r, t]
+        go_left = X[rows[r, 0], feature[current]] <= threshold[current]
+        node[r, t] = np.where(go_left, left[current], right[current])
+        internal[r, t] = left[node[r, t]] != -1
+    return arrays[prefix + "value"][node].mean(axis=1)
+
+def _kernel(spec, X, support_vectors):
+    kernel = spec["kernel"]
+    dot = X @ support_vectors.T
+    if kernel == "linear":
+        return dot
+    if kernel == "rbf":
+        sq = (X ** 2).sum(axis=1)[:, None] + (support_vectors ** 2).sum(axis=1)[None, :] - 2 * dot
+        return np.exp(-spec["gamma"] * np.maximum(sq, 0.0))
+    if kernel == "poly":
+        return (spec["gamma"] * dot + spec["coef0"]) ** spec["degree"]
+    if kernel == "sigmoid":
+        return np.tanh(spec["gamma"] * dot + spec["coef0"])
+    raise ValueError(f"Unsupported SVC kernel: {kernel}")
+
+def _pairwise_coupling(r):
+    """Multi-class probabilities from pairwise ones (libsvm's ``multiclass_probability``)."""
+    n, k, _ = r.shape
+    Q = -r.transpose(0, 2, 1) * r
+    idx = np.arange(k)
+    Q[:, idx, idx] = (r ** 2).sum(axis=1) - r[:, idx, idx] ** 2
+    p = np.full((n, k), 1.0 / k)
+    active = np.ones(n, dtype=bool)
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = np.einsum("ntj,nj->nt", Q, p)
+        pQp = (p * Qp).sum(axis=1)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        a = active
+        for t in range(k):
+            diff = (-Qp[a, t] + pQp[a]) / Q[a, t, t]
+            p[a, t] += diff
+            pQp[a] = (pQp[a] + diff * (diff * Q[a, t, t] + 2 * Qp[a, t])) / (1 + diff) / (1 + diff)
+            Qp[a] = (Qp[a] + diff[:, None] * Q[a, t, :]) / (1 + diff)[:, None]
+            p[a] /= (1 + diff)[:, None]
+    return p
+
+def _svc_proba(arrays, prefix, spec, X):
+    X = np.asarray(X, dtype=np.float64)
+    K = _kernel(spec, X, arrays[prefix + "support_vectors"])
+    dual_coef, intercept = arrays[prefix + "dual_coef"], arrays[prefix + "intercept"]
+    prob_a, prob_b = arrays[prefix + "prob_a"], arrays[prefix + "prob_b"]
+    n_support = arrays[prefix + "n_support"]
+    starts = np.concatenate([[0], np.cumsum(n_support)])
+    k = len(n_support)
+
+    r = np.zeros((len(X), k, k))
+    pair = 0
+    for i in range(k):
+        for j in range(i + 1, k):
+            si, sj = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+            dec = K[:, si] @ dual_coef[j - 1, si] + K[:, sj] @ dual_coef[i, sj] + intercept[pair]
+            p = 1.0 / (1.0 + np.exp(dec * prob_a[pair] + prob_b[pair]))
+            p = np.clip(p, 1e-7, 1 - 1e-7)
+            r[:, i, j], r[:, j, i] = p, 1 - p
+            pair += 1
+    # scikit-learn's bundled libsvm couples the pairwise estimates even for two classes
+    return _pairwise_coupling(r)
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+    "softmax": lambda x: np.exp(x - x.max(axis=-1, keepdims=True))
+    / np.exp(x - x.max(axis=-1, keepdims=True)).sum(axis=-1, keepdims=True),
+}
+
+def _keras_proba(arrays, spec, X):
+    x = np.asarray(X, dtype=np.float32)
+    for layer in spec["layers"]:
+        kind = layer["type"]
+        if kind == "Reshape":
+            x = x.reshape(len(x), *layer["target_shape"])
+        elif kind == "Conv1D":
+            kernel, bias = arrays[layer["weights"] + ".kernel"], arrays[layer["weights"] + ".bias"]
+            windows = np.lib.stride_tricks.sliding_window_view(x, kernel.shape[0], axis=1)
+            windows = windows[:, ::layer["strides"]]
+            x = _ACTIVATIONS[layer["activation"]](np.einsum("nlck,kco->nlo", windows, kernel) + bias)
+        elif kind == "MaxPooling1D":
+            windows = np.lib.stride_tricks.sliding_window_view(x, layer["pool_size"], axis=1)
+            x = windows[:, ::layer["strides"]].max(axis=-1)
+        elif kind == "Flatten":
+            x = x.reshape(len(x), -1)
+        elif kind == "Dense":
+            kernel, bias = arrays[layer["weights"] + ".kernel"], arrays[layer["weights"] + ".bias"]
+            x = _ACTIVATIONS[layer["activation"]](x @ kernel + bias)
+    if x.shape[1] == 1:  # A single sigmoid unit, as KerasClassifier turns it into two columns
+        x = np.hstack([1 - x, x])
+    return x.astype(np.float64)
+
+class CompactModel:
+    """Pure-NumPy predictor over an exported model directory.
+
+    Reproduces ``predict_proba`` and ``predict`` of the exported estimator
+    without scikit-learn or TensorFlow. Arrays are memory-mapped on load.
+
+    Args:
+        directory (str): Directory written by ``export_model``.
+        mmap (bool): Memory-map the arrays instead of reading them into memory.
+    """
+
+    def __init__(self, directory, mmap=True):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model format in {directory}")
+        self.arrays = {}
+        for name in os.listdir(directory):
+            if name.endswith(".npy"):
+                self.arrays[name[:-4]] = np.load(os.path.join(directory, name),
+                                                 mmap_mode="r" if mmap else None)
+        self.classes_ = np.asarray(self.manifest["classes"])
+
+    @property
+    def member_names(self):
+        """Names of the exported ensemble members."""
+        return [m["name"] for m in self.manifest["members"]]
+
+    def member(self, name):
+        """Returns one member as an estimator-like object with ``predict_proba``."""
+        if name not in self.member_names:
+            raise KeyError(name)
+        return _Member(self, name)
+
+    def _member_proba(self, member, X):
+        if member["kind"] == "forest":
+            return _forest_proba(self.arrays, member["prefix"], X)
+        if member["kind"] == "svc":
+            return _svc_proba(self.arrays, member["prefix"], member, X)
+        return _keras_proba(self.arrays, member, X)
+
+    def member_proba(self, name, X):
+        """Returns one member's probabilities over all classes of the model."""
+        member = next(m for m in self.manifest["members"] if m["name"] == name)
+        proba = self._member_proba(member, X)
+        if self.manifest["kind"] == "voting":
+            # Ensemble members were fit on label-encoded targets (0..n_classes-1)
+            aligned = np.zeros((len(proba), len(self.classes_)))
+            aligned[:, np.asarray(member["classes"], dtype=int)] = proba
+            return aligned
+        return proba
+
+    def predict_proba(self, X):
+        """Returns class probabilities (soft-voting average for ensembles)."""
+        X = np.asarray(X)
+        probas = [self.member_proba(m["name"], X) for m in self.manifest["members"]]
+        return np.average(probas, axis=0, weights=self.manifest["weights"])
+
+    def predict(self, X):
+        """Returns the most probable class for each row of X."""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+class _Member:
+    """A single member of a ``CompactModel``, with probabilities over the model's classes."""
+
+    def __init__(self, model, name):
+        self.model, self.name = model, name
+        self.classes_ = model.classes_
+
+    def predict_proba(self, X):
+        return self.model.member_proba(self.name, X)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def is_compact_model(path):
+    """Returns True if ``path`` is a directory written by ``export_model``."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+def load_compact_model(directory, mmap=True):
+    """Loads an exported model directory as a ``CompactModel``."""
+    return CompactModel(directory, mmap=mmap)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained model to the compact NumPy format.")
+    parser.add_argument("model_path", help="Pickled model file (joblib)")
+    parser.add_argument("output_dir", help="Directory to write the compact model to")
+    args = parser.parse_args()
+
+    import joblib
+
+    export_model(joblib.load(args.model_path), args.output_dir)
+    print(f"Exported {args.model_path} to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
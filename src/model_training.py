@@ -1,18 +1,23 @@
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, VotingClassifier
-from sklearn.svm import SVC
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import classification_report
-from sklearn.pipeline import Pipeline
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv1D, MaxPooling1D, Flatten, Dense, Dropout
-from tensorflow.keras.wrappers.scikit_learn import KerasClassifier
+import os
+import sys
+import tempfile
 import numpy as np
+from src.data_processing import track_metadata
+from src.feature_store import FeatureStore
+from src.profiling import profiled, span
+
+# scikit-learn and TensorFlow are imported inside the training functions so
+# that importing this module (e.g. from an inference-only process) stays cheap.
 
 # Function to create a simple CNN model
 def create_cnn(input_shape):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv1D, MaxPooling1D, Flatten, Dense, Dropout, Reshape
+
     model = Sequential()
-    model.add(Conv1D(64, kernel_size=3, activation='relu', input_shape=input_shape))
+    # Take flat feature rows like the other ensemble members and reshape them for the convolutions
+    model.add(Reshape(input_shape, input_shape=(input_shape[0],)))
+    model.add(Conv1D(64, kernel_size=3, activation='relu'))
     model.add(MaxPooling1D(pool_size=2))
     model.add(Conv1D(128, kernel_size=3, activation='relu'))
     model.add(MaxPooling1D(pool_size=2))
@@ -27,18 +32,25 @@ def prepare_data_for_training(features, audio_data):
     """Prepares data for training by associating features with metadata labels.
 
     Args:
-        features (dict): Extracted features for each file.
-        audio_data (dict): Audio data with corresponding metadata.
+        features (dict): Extracted features for each file, or a ``FeatureStore``
+            (whose rows are used as they are, with no per-row conversion; only
+            tracks also present in ``audio_data`` are used).
+        audio_data (dict): Audio data with corresponding metadata (a dict or ``AudioCatalog``).
 
     Returns:
         X, y: Features matrix and label array for training.
     """
-    X = []
-    y = []
-    for filename in features.keys():
-        X.append(list(features[filename].values()))
-        y.append(audio_data[filename][1]["effects"])  # Assume effects metadata is a list of actions
-    return np.array(X), y
+    if isinstance(features, FeatureStore):
+        # The store outlives the library: skip rows of files deleted since they were extracted
+        filenames = [filename for filename in features.filenames if filename in audio_data]
+        X = features.matrix() if len(filenames) == len(features) else features.rows(filenames)
+    else:
+        filenames = list(features)
+        columns = list(features[filenames[0]]) if filenames else []
+        X = np.array([[features[filename][name] for name in columns] for filename in filenames])
+    # Assume effects metadata is a list of actions
+    y = [track_metadata(audio_data, filename)["effects"] for filename in filenames]
+    return X, y
 
 def train_action_prediction_model(X, y):
     """Trains a model to predict actions based on features.
@@ -50,36 +62,225 @@ def train_action_prediction_model(X, y):
     Returns:
         model: Trained classifier model.
     """
+    from sklearn.ensemble import RandomForestClassifier
+
     model = RandomForestClassifier(n_estimators=100)
     model.fit(X, y)
     return model
 
-def train_model(feature_data, labels):
+@profiled()
+def build_training_matrix(feature_data, labels, path=None, max_frames_per_track=None,
+                          max_frames_per_label=None, random_state=None):
+    """Builds the frame-level training matrix in a preallocated float32 memory map.
+
+    Every frame of every track becomes one row, labelled with its track's
+    label. The matrix is sized from the per-track frame counts and filled
+    track by track, so no intermediate Python lists or float64 copies are made.
+
+    A ``FeatureStore`` contributes one row (its per-track summary) per
+    labelled track, sliced straight out of the store without frame
+    subsampling.
+
+    Args:
+        feature_data (dict): Dictionary of (n_features, n_frames) arrays where keys are filenames,
+            or a ``FeatureStore``.
+        labels (dict): Dictionary of labels corresponding to the features.
+        path (str): ``.npy`` file backing the matrix; None uses an anonymous temporary file.
+        max_frames_per_track (int): Randomly subsample tracks with more frames than this.
+        max_frames_per_label (int): Cap the frames per label, split evenly across that label's tracks.
+        random_state (int): Seed for the frame subsampling.
+
+    Returns:
+        X, y: Memory-mapped float32 frame matrix and label array.
+    """
+    if isinstance(feature_data, FeatureStore):
+        filenames = [f for f in feature_data.filenames if f in labels]
+        X = feature_data.rows(filenames)
+        if path is not None:
+            np.save(path, X)
+            X = np.load(path, mmap_mode='r')
+        return X, np.asarray([labels[f] for f in filenames])
+
+    rng = np.random.default_rng(random_state)
+    filenames = list(feature_data)
+
+    counts = {f: feature_data[f].shape[1] for f in filenames}
+    if max_frames_per_track is not None:
+        counts = {f: min(n, max_frames_per_track) for f, n in counts.items()}
+    if max_frames_per_label is not None:
+        tracks_per_label = {}
+        for f in filenames:
+            tracks_per_label.setdefault(labels[f], []).append(f)
+        for tracks in tracks_per_label.values():
+            per_track = max(1, max_frames_per_label // len(tracks))
+            for f in tracks:
+                counts[f] = min(counts[f], per_track)
+
+    n_rows = sum(counts.values())
+    n_features = feature_data[filenames[0]].shape[0] if filenames else 0
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        X = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_rows, n_features))
+        try:
+            os.remove(path)  # The mapping keeps the data alive until X is released
+        except OSError:
+            pass
+    else:
+        X = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_rows, n_features))
+    y = np.empty(n_rows, dtype=np.asarray([labels[f] for f in filenames]).dtype)
+
+    offset = 0
+    for filename in filenames:
+        features = feature_data[filename]
+        n = counts[filename]
+        if n < features.shape[1]:
+            features = features[:, np.sort(rng.choice(features.shape[1], n, replace=False))]
+        X[offset:offset + n] = features.T  # Transpose to get feature vectors
+        y[offset:offset + n] = labels[filename]
+        offset += n
+    return X, y
+
+def pin_threads(n_threads):
+    """Limits the BLAS/OpenMP and TensorFlow thread pools of the current process.
+
+    Args:
+        n_threads (int): Number of threads each pool may use.
+    """
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(n_threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(n_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    if "tensorflow" in sys.modules:
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            pass  # TensorFlow was already initialised in this process
+
+def _resolve_threads(n_jobs, threads_per_job):
+    """Returns (workers, threads per worker) so that workers x threads fits the machine."""
+    cpus = os.cpu_count() or 1
+    workers = cpus if n_jobs is None or n_jobs < 0 else max(1, n_jobs)
+    return workers, threads_per_job or max(1, cpus // workers)
+
+def _fit_member(member, params, X, y, train_idx, val_idx, n_threads, patience):
+    """Fits one ensemble member on a fold and returns (classes, validation probabilities)."""
+    from sklearn.base import clone
+
+    pin_threads(n_threads)
+    estimator = clone(member).set_params(**params)
+    fit_kwargs = {}
+    if hasattr(estimator, "build_fn"):
+        from tensorflow.keras.callbacks import EarlyStopping
+        fit_kwargs["callbacks"] = [EarlyStopping(monitor="loss", patience=patience)]
+    estimator.fit(X[train_idx], y[train_idx], **fit_kwargs)
+    return estimator.classes_, estimator.predict_proba(X[val_idx])
+
+@profiled()
+def search_ensemble(ensemble, param_grid, X, y, cv=3, n_jobs=-1, threads_per_job=None, patience=2):
+    """Grid-searches a soft-voting ensemble by fitting each member once per distinct setting.
+
+    Soft voting averages the members' probabilities (weighted by
+    ``ensemble.weights``), so a member only has to
+    be refit when one of its own parameters changes: per fold, the CNN is fit
+    once, the forest once per ``rf__*`` setting and the SVM once per ``svm__*``
+    setting. Every grid point is then scored by averaging cached validation
+    probabilities. Member fits run in parallel with BLAS/TensorFlow thread
+    pools pinned so that workers x threads does not oversubscribe the
+    machine, and the CNN stops early once its training loss plateaus.
+
+    Args:
+        ensemble: Unfitted soft-voting ``VotingClassifier``.
+        param_grid (dict): Grid over ``<member>__<param>`` keys, as for ``GridSearchCV``.
+        X (array): Feature matrix.
+        y (array): Label array.
+        cv (int): Number of stratified folds.
+        n_jobs (int): Number of worker processes; None or -1 uses all cores.
+        threads_per_job (int): Threads per worker; defaults to cores / workers.
+        patience (int): CNN early-stopping patience in epochs.
+
+    Returns:
+        tuple: (best_params, best_score) with the mean validation accuracy.
+
+    Raises:
+        ValueError: If the ensemble does not use soft voting.
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+    if ensemble.voting != "soft":
+        raise ValueError(f"search_ensemble only supports soft voting, not {ensemble.voting!r}")
+    workers, n_threads = _resolve_threads(n_jobs, threads_per_job)
+    classes, y_encoded = np.unique(y, return_inverse=True)
+    folds = list(StratifiedKFold(n_splits=cv).split(X, y_encoded))
+    members = dict(ensemble.estimators)
+    member_grids = {
+        name: list(ParameterGrid({key.split("__", 1)[1]: values for key, values in param_grid.items()
+                                  if key.startswith(name + "__")}))
+        for name in members
+    }
+
+    tasks = [(fold, name, tuple(sorted(params.items())))
+             for fold in range(len(folds)) for name in members for params in member_grids[name]]
+    results = Parallel(n_jobs=workers)(
+        delayed(_fit_member)(members[name], dict(params), X, y_encoded, *folds[fold], n_threads, patience)
+        for fold, name, params in tasks)
+
+    probas = {}
+    for task, (member_classes, proba) in zip(tasks, results):
+        aligned = np.zeros((len(proba), len(classes)))
+        aligned[:, member_classes] = proba
+        probas[task] = aligned
+
+    best_params, best_score = None, -np.inf
+    for params in ParameterGrid(param_grid):
+        scores = []
+        for fold, (_, val_idx) in enumerate(folds):
+            votes = np.average([probas[(fold, name, tuple(sorted(
+                (key.split("__", 1)[1], value) for key, value in params.items()
+                if key.startswith(name + "__"))))] for name in members], axis=0, weights=ensemble.weights)
+            scores.append(np.mean(votes.argmax(axis=1) == y_encoded[val_idx]))
+        if np.mean(scores) > best_score:
+            best_params, best_score = params, float(np.mean(scores))
+    return best_params, best_score
+
+@profiled()
+def train_model(feature_data, labels, max_frames_per_track=None, matrix_path=None,
+                search="factorized", n_jobs=-1, threads_per_job=None):
     """Trains an ensemble model on multiple audio tracks with CNN and voting classifier.
 
     Args:
         feature_data (dict): Dictionary of features where keys are filenames.
         labels (dict): Dictionary of labels corresponding to the features.
+        max_frames_per_track (int): Subsample tracks with more frames than this.
+        matrix_path (str): ``.npy`` file backing the training matrix (see ``build_training_matrix``).
+        search (str): Hyperparameter search strategy: "factorized" (see ``search_ensemble``),
+            "halving" (successive halving) or "grid" (exhaustive ``GridSearchCV``).
+        n_jobs (int): Number of search worker processes; None or -1 uses all cores.
+        threads_per_job (int): BLAS/TensorFlow threads per worker; defaults to cores / workers.
 
     Returns:
         model: Trained ensemble model.
     """
-    all_features = []
-    all_labels = []
-    
-    for filename in feature_data.keys():
-        features = feature_data[filename]
-        all_features.extend(features.T)  # Transpose to get feature vectors
-        all_labels.extend([labels[filename]] * features.shape[1])
-
-    X_train, X_test, y_train, y_test = train_test_split(np.array(all_features), np.array(all_labels), test_size=0.2)
+    from sklearn.base import clone
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+    from sklearn.svm import SVC
+    from sklearn.model_selection import train_test_split, GridSearchCV
+    from sklearn.metrics import classification_report
+    from tensorflow.keras.wrappers.scikit_learn import KerasClassifier
 
-    # Reshape the data for CNN input (if using 1D audio data, not spectrograms)
-    X_train_cnn = X_train.reshape(X_train.shape[0], X_train.shape[1], 1)
-    X_test_cnn = X_test.reshape(X_test.shape[0], X_test.shape[1], 1)
+    X, y = build_training_matrix(feature_data, labels, path=matrix_path,
+                                 max_frames_per_track=max_frames_per_track)
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.2)
+    train_idx.sort()
+    test_idx.sort()
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
 
-    # Create the CNN model
-    cnn_model = KerasClassifier(build_fn=create_cnn, input_shape=(X_train_cnn.shape[1], 1), epochs=10, batch_size=32, verbose=0)
+    # Create the CNN model (it reshapes the flat rows to (n_features, 1) itself)
+    cnn_model = KerasClassifier(build_fn=create_cnn, input_shape=(X_train.shape[1], 1), epochs=10, batch_size=32, verbose=0)
 
     # Create other models
     rf_model = RandomForestClassifier(n_estimators=100)
@@ -98,13 +299,112 @@ def train_model(feature_data, labels):
         'svm__C': [0.1, 1, 10],
     }
 
-    grid = GridSearchCV(ensemble_model, param_grid, cv=3, n_jobs=-1)
-    grid.fit(X_train_cnn, y_train)
-
-    best_model = grid.best_estimator_
+    if search == "factorized":
+        best_params, _ = search_ensemble(ensemble_model, param_grid, X_train, y_train, cv=3,
+                                         n_jobs=n_jobs, threads_per_job=threads_per_job)
+        with span("refit_best_model"):
+            best_model = clone(ensemble_model).set_params(**best_params).fit(X_train, y_train)
+    elif search in ("grid", "halving"):
+        if search == "halving":
+            from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+            from sklearn.model_selection import HalvingGridSearchCV as SearchCV
+        else:
+            SearchCV = GridSearchCV
+        try:
+            from joblib import parallel_config
+        except ImportError:  # joblib < 1.3
+            from joblib import parallel_backend as parallel_config
+        workers, n_threads = _resolve_threads(n_jobs, threads_per_job)
+        with span("hyperparameter_search", strategy=search), \
+                parallel_config(backend="loky", inner_max_num_threads=n_threads):
+            grid = SearchCV(ensemble_model, param_grid, cv=3, n_jobs=workers)
+            grid.fit(X_train, y_train)
+        best_model = grid.best_estimator_
+    else:
+        raise ValueError(f"Unknown search strategy: {search}")
 
     # Evaluate the best model on the test set
-    y_pred = best_model.predict(X_test_cnn)
+    with span("evaluate"):
+        y_pred = best_model.predict(X_test)
     print(classification_report(y_test, y_pred))
     
     return best_model
+
+def detect_drift(model, X, y, threshold=0.7, max_unseen=0.2):
+    """Checks whether updated labels have drifted too far for an incremental update.
+
+    Feedback adjusts individual labels to values the model may never have
+    seen, which an incremental update cannot learn. A few such rows are
+    expected, so drift is only reported when more than ``max_unseen`` of the
+    rows carry unseen labels, or when the model's accuracy on the remaining
+    rows drops below ``threshold``. The model is usually scored on the rows
+    it was trained on, so in practice the accuracy check only catches label
+    changes, not a decline in generalisation.
+
+    Args:
+        model: Trained ensemble model.
+        X (array): Feature matrix.
+        y (array): Updated label array.
+        threshold (float): Minimum accuracy for which the model is still considered valid.
+        max_unseen (float): Maximum share of rows whose label is not among ``model.classes_``.
+
+    Returns:
+        bool: True if a full retraining is needed.
+    """
+    seen = np.isin(y, model.classes_)
+    if not len(y) or 1 - seen.mean() > max_unseen:
+        return True
+    return model.score(X[seen], y[seen]) < threshold
+
+@profiled()
+def update_model(model, feature_data, labels, extra_trees=50, epochs=2, drift_threshold=0.7, max_unseen=0.2):
+    """Updates a trained ensemble in place from new labels instead of retraining it.
+
+    The random forest is warm-started with ``extra_trees`` additional trees,
+    the CNN continues training for ``epochs`` epochs, and the SVM is refit
+    with the hyperparameters found by the last search. Rows whose label is
+    not among the model's classes are left out of the update (the next full
+    retraining learns them). When drift is detected (see ``detect_drift``),
+    or when leaving those rows out removes one of the model's classes, a full
+    ``train_model`` search runs instead.
+
+    Args:
+        model: Ensemble returned by ``train_model``.
+        feature_data (dict): Dictionary of features where keys are filenames.
+        labels (dict): Dictionary of (updated) labels corresponding to the features.
+        extra_trees (int): Number of trees added to the random forest.
+        epochs (int): Number of additional CNN training epochs.
+        drift_threshold (float): Accuracy below which a full retraining is triggered.
+        max_unseen (float): Share of rows with unseen labels above which a full retraining is triggered.
+
+    Returns:
+        model: The updated (or fully retrained) ensemble model.
+    """
+    X, y = build_training_matrix(feature_data, labels)
+
+    if detect_drift(model, X, y, drift_threshold, max_unseen):
+        print("Label drift detected, running a full hyperparameter search")
+        return train_model(feature_data, labels)
+    seen = np.isin(y, model.classes_)
+    if not seen.all():
+        X, y = X[seen], y[seen]
+
+    # The voting classifier fits its members on label-encoded targets
+    y_encoded = model.le_.transform(y)
+    if len(np.unique(y_encoded)) < len(model.classes_):
+        # The members cannot be refit (or warm-started) without every class present
+        print("Feedback removed every example of a class, running a full hyperparameter search")
+        return train_model(feature_data, labels)
+
+    members = model.named_estimators_
+    if 'rf' in members:
+        rf = members['rf']
+        rf.set_params(warm_start=True, n_estimators=rf.n_estimators + extra_trees)
+        rf.fit(X, y_encoded)
+    if 'cnn' in members:
+        cnn = members['cnn']
+        cnn.model.fit(X, np.searchsorted(cnn.classes_, y_encoded), epochs=epochs,
+                      batch_size=cnn.sk_params.get('batch_size', 32), verbose=0)
+    if 'svm' in members:
+        members['svm'].fit(X, y_encoded)
+    return model
@@ -0,0 +1,189 @@
+# pipeline.py
+import argparse
+import json
+import queue
+import threading
+from src.data_processing import iter_audio_files
+from src.feature_extraction import extract_basic_features
+from src.action_suggestion import (cut_candidates, cuts_from_predictions, feature_matrix, predict_labels,
+                                   timed_cuts_from_candidates)
+from src.profiling import span
+
+_DONE = object()
+
+class _Failure:
+    """Carries an exception raised in a worker thread to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+def _put(q, item, stop):
+    """Puts an item on a bounded queue, giving up once ``stop`` is set."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _decode(directory, decoded, stop, n_decoders, n_extractors, queue_size, sr, filenames):
+    try:
+        for filename, audio, file_sr, metadata in iter_audio_files(
+                directory, n_jobs=n_decoders, max_pending=queue_size, sr=sr, filenames=filenames):
+            if not _put(decoded, (filename, audio, file_sr), stop):
+                return
+    except Exception as e:
+        _put(decoded, _Failure(e), stop)
+    for _ in range(n_extractors):
+        _put(decoded, _DONE, stop)
+
+def _extract(decoded, extracted, stop, cache, timed_cuts):
+    while not stop.is_set():
+        try:
+            item = decoded.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE or isinstance(item, _Failure):
+            _put(extracted, item, stop)
+            return
+        filename, audio, sr = item
+        try:
+            if timed_cuts:
+                candidates = cut_candidates(audio, sr)
+                features = candidates["features"]
+            else:
+                candidates = None
+                features = extract_basic_features({filename: audio}, cache=cache, sr=sr)[filename]
+        except Exception as e:
+            _put(extracted, _Failure(e), stop)
+            return
+        if not _put(extracted, (filename, features, candidates), stop):
+            return
+
+def iter_pipelined(directory, model, n_decoders=1, n_extractors=2, batch_size=32, max_wait=0.05,
+                   queue_size=16, cascade_threshold=None, cache=None, sr=None, filenames=None, timed_cuts=True):
+    """Streams suggestions for a directory with decoding, extraction and prediction overlapped.
+
+    A producer thread decodes files (in ``n_decoders`` processes, see
+    ``iter_audio_files``). ``n_extractors`` threads compute the
+    ``extract_basic_features`` summary and the cut candidates (see
+    ``suggest_timed_cuts``) of each track from one STFT. The calling thread
+    collects up to ``batch_size`` feature rows, waiting at most ``max_wait``
+    seconds for more, and predicts them in one call. The stages are connected
+    by queues of at most ``queue_size`` items: a slow stage blocks the one in
+    front of it, so at most about ``2 * queue_size`` decoded tracks are in
+    memory at once. Stopping the iteration early shuts the workers down.
+
+    Args:
+        directory (str): Directory of ``.wav`` files.
+        model: Trained model.
+        n_decoders (int): Number of decoding processes.
+        n_extractors (int): Number of feature extraction threads.
+        batch_size (int): Maximum tracks per model call.
+        max_wait (float): Seconds to wait for a batch to fill once it has one track.
+        queue_size (int): Capacity of each inter-stage queue.
+        cascade_threshold (float): Enable cascade inference (see ``predict_actions``).
+        cache (FeatureCache): Feature cache for ``timed_cuts=False``; None uses the default
+            cache, False disables caching. Timed cuts always compute frames afresh.
+        sr (int): Sample rate to resample to at load time, or None to keep native rates.
+        filenames (list): Process only these files of the directory.
+        timed_cuts (bool): Suggest cuts at concrete positions (as ``predict_actions`` does).
+
+    Yields:
+        tuple: (filename, action, cuts) for each track, in completion order.
+    """
+    decoded = queue.Queue(maxsize=queue_size)
+    extracted = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    workers = [threading.Thread(target=_decode, daemon=True,
+                                args=(directory, decoded, stop, n_decoders, n_extractors, queue_size, sr,
+                                      filenames))]
+    workers += [threading.Thread(target=_extract, args=(decoded, extracted, stop, cache, timed_cuts),
+                                 daemon=True)
+                for _ in range(n_extractors)]
+    for worker in workers:
+        worker.start()
+
+    running = n_extractors
+    try:
+        while running:
+            batch = []
+            item = extracted.get()
+            while True:
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, _Failure):
+                    raise item.error
+                else:
+                    batch.append(item)
+                if len(batch) >= batch_size or not running:
+                    break
+                try:
+                    item = extracted.get(timeout=max_wait if batch else None)
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+            with span("pipeline.predict", n_tracks=len(batch)):
+                batch_filenames, X = feature_matrix({filename: features for filename, features, _ in batch})
+                predictions = predict_labels(model, X, batch_size, cascade_threshold)
+                if timed_cuts:
+                    cuts = timed_cuts_from_candidates(model, {filename: candidates
+                                                              for filename, _, candidates in batch},
+                                                      cascade_threshold=cascade_threshold)
+                else:
+                    cuts = cuts_from_predictions(batch_filenames, predictions)
+            for filename, prediction in zip(batch_filenames, predictions):
+                yield filename, prediction, cuts[filename]
+    finally:
+        stop.set()
+        for q in (decoded, extracted):
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        for worker in workers:
+            worker.join()
+
+def run_pipelined_inference(model_path, directory, **kwargs):
+    """Pipelined counterpart of ``run_inference`` for a directory of audio files.
+
+    Args:
+        model_path (str): Path to the pre-trained model file or compact model directory.
+        directory (str): Directory of ``.wav`` files.
+        **kwargs: Passed on to ``iter_pipelined``.
+
+    Returns:
+        tuple: (actions, cuts) dictionaries keyed by filename.
+    """
+    from src.inference import get_model
+
+    actions, cuts = {}, {}
+    for filename, action, track_cuts in iter_pipelined(directory, get_model(model_path), **kwargs):
+        actions[filename], cuts[filename] = action, track_cuts
+    return actions, cuts
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream suggestions for a directory of audio files.")
+    parser.add_argument("model_path", help="Path to the pre-trained model file or compact model directory")
+    parser.add_argument("audio_dir", help="Directory of .wav files to analyse")
+    parser.add_argument("--decoders", type=int, default=1, help="Number of decoding processes")
+    parser.add_argument("--extractors", type=int, default=2, help="Number of feature extraction threads")
+    parser.add_argument("--batch-size", type=int, default=32, help="Maximum tracks per model call")
+    parser.add_argument("--queue-size", type=int, default=16, help="Capacity of each inter-stage queue")
+    parser.add_argument("--cascade-threshold", type=float,
+                        help="Only send tracks below this random-forest confidence to the full ensemble")
+    args = parser.parse_args()
+
+    from src.inference import get_model, to_jsonable
+
+    stream = iter_pipelined(args.audio_dir, get_model(args.model_path), n_decoders=args.decoders,
+                            n_extractors=args.extractors, batch_size=args.batch_size,
+                            queue_size=args.queue_size, cascade_threshold=args.cascade_threshold)
+    for filename, action, cuts in stream:
+        print(json.dumps(to_jsonable({"filename": filename, "action": action, "cuts": cuts})), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Profiling is off unless MASTERIA_PROFILE is set (or enable() is called). When
+# off, span() returns a shared no-op context manager and profiled functions
+# pay a single flag check.
+_enabled = False
+_trace_memory = False
+_started_tracemalloc = False
+_events = []
+_events_lock = threading.Lock()
+_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+# tracemalloc.reset_peak() is new in Python 3.9. Without it a span's peak is
+# approximated by the traced memory at its boundaries and those of its children.
+_HAS_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+def enable(memory=True):
+    """Turns profiling on.
+
+    Args:
+        memory (bool): Also record the peak traced memory of each span (uses ``tracemalloc``).
+    """
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = True
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+def disable():
+    """Turns profiling off; recorded spans are kept until ``reset``."""
+    global _enabled, _started_tracemalloc
+    _enabled = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+def is_enabled():
+    """Returns True if spans are currently being recorded."""
+    return _enabled
+
+def reset():
+    """Discards all recorded spans."""
+    with _events_lock:
+        _events.clear()
+
+def call_recorded(function, *args, enabled=True, memory=True):
+    """Calls a function and returns its result together with the spans it recorded.
+
+    Meant to run in a worker process, whose spans would otherwise stay in
+    that process; pass the returned events to ``add_events`` in the parent.
+
+    Args:
+        function (callable): Function to call with ``args``.
+        enabled (bool): Whether the parent is profiling.
+        memory (bool): Whether the parent traces memory.
+
+    Returns:
+        tuple: (result, list of trace events).
+    """
+    if enabled and not _enabled:
+        enable(memory)
+    with _events_lock:
+        mark = len(_events)
+    result = function(*args)
+    with _events_lock:
+        events = _events[mark:]
+        del _events[mark:]
+    return result, events
+
+def worker_options():
+    """Returns the ``call_recorded`` keyword arguments mirroring this process's profiling state."""
+    return {"enabled": _enabled, "memory": _trace_memory}
+
+def add_events(events):
+    """Adds trace events recorded elsewhere (see ``call_recorded``)."""
+    with _events_lock:
+        _events.extend(events)
+
+def _traced_peak():
+    """Returns the traced memory peak since the last reset, or the current size without ``reset_peak``."""
+    current, peak = tracemalloc.get_traced_memory()
+    return peak if _HAS_RESET_PEAK else current
+
+class _Span:
+    """Records the wall time and peak memory of a block as one trace event."""
+
+    __slots__ = ("name", "attrs", "start", "mem_start", "mem_seen")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if _trace_memory and tracemalloc.is_tracing():
+            peak = _traced_peak()
+            if stack and stack[-1].mem_start is not None:
+                stack[-1].mem_seen = max(stack[-1].mem_seen, peak)
+            if _HAS_RESET_PEAK:
+                tracemalloc.reset_peak()
+            self.mem_start = self.mem_seen = tracemalloc.get_traced_memory()[0]
+        else:
+            self.mem_start = self.mem_seen = None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stack = _local.stack
+        stack.pop()
+        args = dict(self.attrs)
+        if self.mem_start is not None and tracemalloc.is_tracing():
+            self.mem_seen = max(self.mem_seen, _traced_peak())
+            args["peak_bytes"] = self.mem_seen - self.mem_start
+            if stack and stack[-1].mem_start is not None:
+                stack[-1].mem_seen = max(stack[-1].mem_seen, self.mem_seen)
+        with _events_lock:
+            _events.append({
+                "name": self.name,
+                "ph": "X",
+                "ts": self.start * 1e6,
+                "dur": (end - self.start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            })
+        return False
+
+def span(name, **attrs):
+    """Returns a context manager timing a block as a named span.
+
+    Args:
+        name (str): Span name, e.g. the pipeline stage.
+        **attrs: Extra values stored with the span (e.g. ``track=filename``).
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+def profiled(name=None):
+    """Decorator recording every call of a function as a span.
+
+    Args:
+        name (str): Span name; defaults to the function's qualified name.
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summary():
+    """Aggregates the recorded spans by name.
+
+    Returns:
+        dict: Span name to {"count", "total_s", "mean_s", "max_s", "max_peak_bytes", "slowest"},
+        where ``slowest`` holds the attributes of the longest call (e.g. the hottest track).
+    """
+    with _events_lock:
+        events = list(_events)
+    stats = {}
+    for event in events:
+        entry = stats.setdefault(event["name"], {"count": 0, "total_s": 0.0, "max_s": 0.0,
+                                                 "max_peak_bytes": None, "slowest": None})
+        seconds = event["dur"] / 1e6
+        entry["count"] += 1
+        entry["total_s"] += seconds
+        if seconds >= entry["max_s"]:
+            entry["max_s"] = seconds
+            entry["slowest"] = {k: v for k, v in event["args"].items() if k != "peak_bytes"} or None
+        peak = event["args"].get("peak_bytes")
+        if peak is not None:
+            entry["max_peak_bytes"] = max(peak, entry["max_peak_bytes"] or 0)
+    for entry in stats.values():
+        entry["mean_s"] = entry["total_s"] / entry["count"]
+    return dict(sorted(stats.items(), key=lambda item: -item[1]["total_s"]))
+
+def write_summary(path):
+    """Writes the per-span summary as JSON."""
+    with open(path, 'w') as f:
+        json.dump(summary(), f, indent=2, default=str)
+
+def write_chrome_trace(path):
+    """Writes the recorded spans in Chrome trace format (chrome://tracing, Perfetto)."""
+    with _events_lock:
+        events = list(_events)
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+if os.environ.get("MASTERIA_PROFILE", "") not in ("", "0"):
+    enable(memory=os.environ.get("MASTERIA_PROFILE_MEMORY", "1") != "0")
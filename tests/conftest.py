@@ -0,0 +1,50 @@
+import json
+import joblib
+import numpy as np
+import pytest
+import soundfile as sf
+
+@pytest.fixture
+def synthetic_tracks(tmp_path):
+    """Writes a few short sine-wave tracks with effect metadata into a temporary directory."""
+    sr = 22050
+    rng = np.random.default_rng(0)
+    for i, freq in enumerate([220.0, 440.0, 880.0]):
+        t = np.arange(int(sr * 1.5)) / sr
+        audio = 0.5 * np.sin(2 * np.pi * freq * t) + 0.01 * rng.standard_normal(t.size)
+        sf.write(tmp_path / f"track{i}.wav", audio.astype(np.float32), sr)
+        with open(tmp_path / f"track{i}.json", "w") as f:
+            json.dump({"effects": i % 2}, f)
+    return tmp_path
+
+@pytest.fixture
+def make_rf_model():
+    """Returns a factory fitting a small random forest on basic-feature-shaped rows.
+
+    The factory takes ``n_estimators`` and an optional ``path`` the model is pickled to.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    def make(n_estimators=5, path=None):
+        X = np.random.default_rng(0).random((20, 3)) * [5000, 0.5, 3000]
+        model = RandomForestClassifier(n_estimators=n_estimators, random_state=0).fit(X, np.arange(20) % 2)
+        if path is not None:
+            joblib.dump(model, path)
+        return model
+    return make
+
+@pytest.fixture
+def synthetic_songs(tmp_path):
+    """Writes two songs of three stems with differing sample rates and lengths."""
+    root = tmp_path / "tracks"
+    for s in range(2):
+        song_dir = root / f"song{s}"
+        song_dir.mkdir(parents=True)
+        for j, (name, sr, duration) in enumerate([("drums", 22050, 1.0), ("bass", 44100, 0.8),
+                                                   ("vocals", 22050, 1.2)]):
+            t = np.arange(int(sr * duration)) / sr
+            audio = 0.3 * np.sin(2 * np.pi * 110.0 * (j + 1) * (s + 1) * t)
+            sf.write(song_dir / f"{name}.wav", audio.astype(np.float32), sr)
+        with open(song_dir / "metadata.json", "w") as f:
+            json.dump({"effects": s}, f)
+    return root
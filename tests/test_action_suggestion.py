@@ -0,0 +1,127 @@
+import numpy as np
+from src.action_suggestion import suggest_actions, suggest_cuts
+
+class CountingModel:
+    """Predicts 1 when the first feature is positive and counts model calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return (np.asarray(X)[:, 0] > 0).astype(int)
+
+def make_features(n):
+    return {f"track{i}.wav": {"spectral_centroid": float(i % 2), "rmse": 0.1, "loudness": 0.2}
+            for i in range(n)}
+
+def test_suggest_actions_batches_predictions():
+    model = CountingModel()
+    actions = suggest_actions(model, make_features(10), batch_size=4)
+    assert model.calls == [4, 4, 2]
+    assert actions["track3.wav"] == 1 and actions["track4.wav"] == 0
+
+def test_suggest_cuts_batches_predictions():
+    model = CountingModel()
+    cuts = suggest_cuts(model, make_features(5))
+    assert model.calls == [5]
+    assert len(cuts["track1.wav"]) == 2 and cuts["track2.wav"] == []
+
+def test_cascade_escalates_only_unsure_tracks():
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+    from sklearn.linear_model import LogisticRegression
+    from src.action_suggestion import cascade_predict
+
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 3))
+    y = (X[:, 0] > 0.5).astype(int)
+    model = VotingClassifier([("rf", RandomForestClassifier(n_estimators=20, random_state=0)),
+                              ("lr", LogisticRegression())], voting="soft").fit(X, y)
+    X_test = rng.random((50, 3))
+
+    predictions, stats = cascade_predict(model, X_test, threshold=0.9, audit=True)
+    confident = model.named_estimators_["rf"].predict_proba(X_test).max(axis=1) >= 0.9
+    assert stats["n_tracks"] == 50 and stats["n_escalated"] == int((~confident).sum())
+    np.testing.assert_array_equal(predictions[~confident], model.predict(X_test[~confident]))
+    assert 0.0 <= stats["agreement"] <= 1.0
+
+    predictions, stats = cascade_predict(model, X_test, threshold=1.01)
+    assert stats["escalation_rate"] == 1.0
+    np.testing.assert_array_equal(predictions, model.predict(X_test))
+
+class CountingProbaModel:
+    """Scores windows by their RMS energy and counts ``predict_proba`` calls."""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        p = np.clip(np.asarray(X)[:, 1] * 2, 0, 1)
+        return np.column_stack([1 - p, p])
+
+def test_suggest_timed_cuts_scores_all_windows_at_once(synthetic_tracks):
+    from src.action_suggestion import suggest_timed_cuts
+    from src.data_processing import load_audio_files
+
+    audio_data = load_audio_files(str(synthetic_tracks))
+    model = CountingProbaModel()
+    cuts = suggest_timed_cuts(model, audio_data, top_k=3, min_score=0.0, window_beats=2)
+    assert len(model.calls) == 1
+    for filename, suggestions in cuts.items():
+        assert 0 < len(suggestions) <= 3
+        scores = [cut["score"] for cut in suggestions]
+        assert scores == sorted(scores, reverse=True)
+        for cut in suggestions:
+            assert set(cut) == {"action", "location", "description", "time", "score"}
+            assert 0.0 <= cut["time"] < audio_data[filename].duration
+
+class CascadeProbaModel(CountingProbaModel):
+    """Full model whose "rf" first stage is only sure about windows with little energy."""
+
+    member_names = ["rf"]
+
+    def __init__(self):
+        super().__init__()
+        self.first_stage = CountingProbaModel()
+
+    def member(self, name):
+        return self.first_stage
+
+def test_timed_cuts_escalate_only_unsure_windows(synthetic_tracks):
+    from src.action_suggestion import cut_candidates, timed_cuts_from_candidates
+    from src.data_processing import load_audio_files
+
+    audio_data = load_audio_files(str(synthetic_tracks))
+    candidates = {f: cut_candidates(t.audio, t.sr, window_beats=2) for f, t in audio_data.items()}
+    X = np.vstack([c["X"] for c in candidates.values()])
+    unsure = np.clip(X[:, 1] * 2, 0, 1)
+    unsure = np.maximum(unsure, 1 - unsure) < 0.9
+
+    model = CascadeProbaModel()
+    cascaded = timed_cuts_from_candidates(model, candidates, min_score=0.0, cascade_threshold=0.9)
+    assert model.first_stage.calls == [len(X)]
+    assert model.calls == ([int(unsure.sum())] if unsure.any() else [])
+    # Here both stages score alike, so the cascade changes cost but not the suggestions
+    assert cascaded == timed_cuts_from_candidates(CountingProbaModel(), candidates, min_score=0.0)
+
+def test_cut_candidates_handle_tracks_shorter_than_a_window():
+    from src.action_suggestion import cut_candidates
+
+    sr = 22050
+    audio = 0.1 * np.sin(2 * np.pi * 220.0 * np.arange(int(0.6 * sr)) / sr)
+    candidates = cut_candidates(audio, sr, window_beats=4)
+    assert candidates["X"].shape == (1, 3)
+    assert candidates["start"][0] == 0.0 and candidates["end"][0] <= 0.6
+
+def test_cut_candidates_carry_the_whole_track_summary(synthetic_tracks):
+    from src.action_suggestion import cut_candidates
+    from src.data_processing import load_audio_files
+    from src.feature_extraction import extract_basic_features
+
+    audio_data = load_audio_files(str(synthetic_tracks))
+    expected = extract_basic_features(audio_data, cache=False)
+    for filename, track in audio_data.items():
+        assert cut_candidates(track.audio, track.sr)["features"] == expected[filename]
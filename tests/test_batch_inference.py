@@ -0,0 +1,47 @@
+import os
+import pytest
+from src.batch_inference import merge_shards, run_shard, shard_files, shard_of, shard_path
+from src.data_processing import load_audio_files
+from src.inference import predict_actions, to_jsonable
+
+def test_shard_of_is_deterministic_and_partitions():
+    names = [f"track{i}.wav" for i in range(100)]
+    shards = [shard_of(name, 4) for name in names]
+    assert shards == [shard_of(name, 4) for name in names]
+    assert set(shards) == {0, 1, 2, 3}
+
+def test_shards_merge_into_full_results(tmp_path, synthetic_tracks, make_rf_model):
+    model_path, out = str(tmp_path / "model.pkl"), str(tmp_path / "shards")
+    model = make_rf_model(path=model_path)
+    directory = str(synthetic_tracks)
+
+    assert sorted(sum((shard_files(directory, i, 2) for i in range(2)), [])) == \
+        ["track0.wav", "track1.wav", "track2.wav"]
+    run_shard(directory, model_path, out, 0, 2)
+    with pytest.raises(ValueError):
+        merge_shards(out)  # shard 1 has not run yet
+    run_shard(directory, model_path, out, 1, 2)
+
+    # A torn final line is dropped and the rerun skips finished files
+    with open(shard_path(out, 1, 2), "a") as f:
+        f.write('{"filename": "trunc')
+    assert run_shard(directory, model_path, out, 1, 2)[0] == 0
+
+    # A shard stopped part-way (no completion marker) is not merged
+    os.remove(shard_path(out, 0, 2) + ".done")
+    with pytest.raises(ValueError, match="not finished"):
+        merge_shards(out)
+    run_shard(directory, model_path, out, 0, 2)
+
+    # Merging while a line is still being written leaves the shard file alone
+    with open(shard_path(out, 1, 2), "a") as f:
+        f.write('{"filename": "trunc')
+    with open(shard_path(out, 1, 2), "rb") as f:
+        before = f.read()
+    actions, cuts = merge_shards(out)
+    with open(shard_path(out, 1, 2), "rb") as f:
+        assert f.read() == before
+
+    expected_actions, expected_cuts = predict_actions(model, load_audio_files(directory))
+    assert actions == to_jsonable(expected_actions)
+    assert cuts == to_jsonable(expected_cuts)
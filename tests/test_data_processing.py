@@ -1,6 +1,8 @@
 import os
 import pytest
-from src.data_processing import load_audio_files, split_tracks
+import numpy as np
+from src.data_processing import load_audio_files, load_audio_files_with_metadata, iter_audio_files, split_tracks, segment_audio, Track, AudioCatalog, load_songs
+from src.model_training import prepare_data_for_training
 
 def test_load_audio_files():
     directory = "test_data/raw/tracks"
@@ -19,3 +21,100 @@ def test_split_tracks():
         assert len(segments) > 0
         for segment in segments:
             assert len(segment) > 0
+
+def test_iter_audio_files_parallel_matches_serial(synthetic_tracks):
+    serial = {f: (audio, sr, meta) for f, audio, sr, meta in iter_audio_files(str(synthetic_tracks))}
+    parallel = list(iter_audio_files(str(synthetic_tracks), n_jobs=2))
+    assert len(parallel) == len(serial) == 3
+    for filename, audio, sr, metadata in parallel:
+        assert sr == serial[filename][1]
+        assert metadata == serial[filename][2]
+        assert np.array_equal(audio, serial[filename][0])
+
+def test_load_audio_files_with_metadata_parallel(synthetic_tracks):
+    audio_data = load_audio_files_with_metadata(str(synthetic_tracks), n_jobs=2)
+    assert sorted(audio_data) == ["track0.wav", "track1.wav", "track2.wav"]
+    assert audio_data["track1.wav"][1] == {"effects": 1}
+
+def test_loaders_return_track_records(synthetic_tracks):
+    audio_data = load_audio_files(str(synthetic_tracks), sr=16000)
+    track = audio_data["track0.wav"]
+    assert isinstance(track, Track)
+    assert track.sr == 16000
+    assert track.duration == pytest.approx(1.5, abs=1e-3)
+    assert track.path == os.path.join(str(synthetic_tracks), "track0.wav")
+    segmented = split_tracks(audio_data, segment_length=1)
+    assert segmented["track0.wav"].shape == (2, 16000)
+
+def test_segment_audio_is_a_view_with_overlap():
+    audio = np.arange(10, dtype=np.float32)
+    segments = segment_audio(audio, sr=1, segment_length=4, hop_length=2, tail="drop")
+    assert segments.shape == (4, 4)
+    assert np.shares_memory(segments, audio)
+    assert segments[1].tolist() == [2, 3, 4, 5]
+
+def test_segment_audio_pads_tail():
+    audio = np.ones(10, dtype=np.float32)
+    segments = segment_audio(audio, sr=1, segment_length=4)
+    assert segments.shape == (3, 4)
+    assert segments[-1].tolist() == [1, 1, 0, 0]
+    assert segment_audio(audio[:3], sr=1, segment_length=4, tail="drop").shape == (0, 4)
+
+def test_audio_catalog_decodes_lazily_within_budget(tmp_path, synthetic_tracks):
+    eager = load_audio_files_with_metadata(str(synthetic_tracks))
+    track_bytes = eager["track0.wav"].audio.nbytes
+    catalog = AudioCatalog(str(synthetic_tracks), max_bytes=track_bytes, cache_dir=str(tmp_path / "decoded"))
+    assert list(catalog) == list(eager) and catalog.cached_bytes() == 0
+
+    X, y = prepare_data_for_training({f: {"x": 1.0} for f in catalog}, catalog)
+    assert y == [0, 1, 0] and catalog.cached_bytes() == 0
+
+    for filename, track in catalog.items():
+        np.testing.assert_array_equal(track.audio, eager[filename].audio)
+        assert track.sr == eager[filename].sr and track.metadata == eager[filename].metadata
+        assert catalog.cached_bytes() <= track_bytes
+
+    # A second catalog reads the memory-mapped decoded copies
+    reopened = AudioCatalog(str(synthetic_tracks), cache_dir=str(tmp_path / "decoded"))
+    assert isinstance(reopened["track1.wav"].audio, np.memmap)
+    assert reopened["track1.wav"].sr == eager["track1.wav"].sr
+
+def test_audio_catalog_decoded_copies_are_replaced_and_bounded(tmp_path, synthetic_tracks):
+    decoded = tmp_path / "decoded"
+    catalog = AudioCatalog(str(synthetic_tracks), cache_dir=str(decoded))
+    catalog["track0.wav"]
+    track0 = os.path.join(str(synthetic_tracks), "track0.wav")
+    os.utime(track0, ns=(0, os.stat(track0).st_mtime_ns + 10 ** 9))
+    AudioCatalog(str(synthetic_tracks), cache_dir=str(decoded))["track0.wav"]
+    assert len(os.listdir(decoded)) == 1  # The copy of the old file state was removed
+
+    copy_bytes = os.path.getsize(next(decoded.iterdir()))
+    bounded = AudioCatalog(str(synthetic_tracks), max_bytes=0, cache_dir=str(decoded),
+                           cache_max_bytes=2 * copy_bytes)
+    for filename in bounded:
+        bounded[filename]
+    assert sum(f.stat().st_size for f in decoded.iterdir()) <= 2 * copy_bytes
+
+def test_audio_catalog_lists_the_copy_directory_once(tmp_path, synthetic_tracks, monkeypatch):
+    decoded = tmp_path / "decoded"
+    catalog = AudioCatalog(str(synthetic_tracks), max_bytes=0, cache_dir=str(decoded))
+    scandir, scans = os.scandir, []
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    for _ in range(2):
+        for filename in catalog:
+            catalog[filename]
+    assert len(scans) == 1
+
+    # Copies removed behind the catalog's back are decoded again
+    for copy in decoded.iterdir():
+        copy.unlink()
+    assert catalog["track0.wav"].sr > 0 and len(os.listdir(decoded)) == 1
+
+def test_load_songs_aligns_stems_and_mix(synthetic_songs):
+    songs = load_songs(str(synthetic_songs), n_jobs=2)
+    assert list(songs) == ["song0", "song1"]
+    song = songs["song0"]
+    assert song.stems == ["bass", "drums", "vocals", "mix"]
+    assert song.sr == 44100 and song.audio.shape == (4, int(44100 * 1.2))
+    np.testing.assert_allclose(song.audio[-1], song.audio[:-1].sum(axis=0), atol=1e-6)
+    assert song.metadata == {"effects": 0}
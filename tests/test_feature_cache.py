@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pytest
+from src.feature_cache import FeatureCache
+from src.feature_extraction import extract_features
+
+def test_cache_round_trip(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    audio = np.arange(100, dtype=np.float32)
+    key = cache.key(audio, {"sr": 22050})
+    assert cache.get(key, ["mfcc"]) == {}
+    cache.put(key, {"mfcc": np.ones((13, 4))})
+    cached = cache.get(key, ["mfcc", "mel"])
+    assert list(cached) == ["mfcc"]
+    assert isinstance(cached["mfcc"], np.memmap)
+    assert cache.key(audio, {"sr": 44100}) != key
+    cache.invalidate(audio=audio)
+    assert cache.get(key, ["mfcc"]) == {}
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    keys = []
+    for i in range(3):
+        key = cache.key(np.full(10, i, dtype=np.float32), {})
+        cache.put(key, {"mel": np.zeros(1000)})
+        os.utime(os.path.join(str(tmp_path), key), (i, i))
+        keys.append(key)
+    cache.get(keys[0], ["mel"])
+    cache.evict(2 * 8200)
+    assert cache.get(keys[1], ["mel"]) == {}
+    assert cache.get(keys[0], ["mel"]) and cache.get(keys[2], ["mel"])
+
+def test_extract_features_uses_cache(tmp_path, monkeypatch):
+    import src.feature_extraction as fe
+    cache = FeatureCache(str(tmp_path))
+    audio_data = {"a.wav": np.random.default_rng(0).standard_normal(22050).astype(np.float32)}
+    first = extract_features(audio_data, include=("mfcc",), cache=cache, sr=22050)
+    monkeypatch.setattr(fe, "compute_features", lambda *args, **kwargs: pytest.fail("cache miss"))
+    second = extract_features(audio_data, include=("mfcc",), cache=cache, sr=22050)
+    assert np.allclose(first["a.wav"]["mfcc"], second["a.wav"]["mfcc"])
+
+def test_bounded_cache_scans_only_when_over_budget(tmp_path, monkeypatch):
+    cache = FeatureCache(str(tmp_path), max_bytes=40 * 8200)
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+    for i in range(200):
+        cache.put(cache.key(np.full(10, i, dtype=np.float32), {}), {"mel": np.zeros(1000)})
+    assert len(scans) < 50
+    assert cache.size() <= 40 * 8200
@@ -1,7 +1,9 @@
 import os
 import pytest
-from src.data_processing import load_audio_files
-from src.feature_extraction import extract_mfcc, extract_spectrogram
+import numpy as np
+import librosa
+from src.data_processing import load_audio_files, load_songs
+from src.feature_extraction import extract_mfcc, extract_spectrogram, compute_features, extract_features_blockwise, extract_song_features, iter_song_features
 
 def test_extract_mfcc():
     directory = "test_data/raw/tracks"
@@ -21,3 +23,41 @@ def test_extract_spectrogram():
         assert S is not None
         assert S.shape[0] > 0
         assert S.shape[1] > 0
+
+def test_compute_features_matches_librosa():
+    sr = 22050
+    audio = (0.3 * np.random.default_rng(0).standard_normal(2 * sr)).astype(np.float32)
+    features = compute_features(audio, sr)
+    assert np.allclose(features["spectral_centroid"], librosa.feature.spectral_centroid(y=audio, sr=sr), rtol=1e-4)
+    assert np.allclose(features["spectral_bandwidth"], librosa.feature.spectral_bandwidth(y=audio, sr=sr), rtol=1e-4)
+    assert np.allclose(features["rmse"], librosa.feature.rms(y=audio))
+    assert np.allclose(features["mel"], librosa.feature.melspectrogram(y=audio, sr=sr), rtol=1e-3)
+    assert np.allclose(features["mfcc"], librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13), atol=1e-3)
+
+def test_compute_features_subset():
+    audio = np.zeros(22050, dtype=np.float32)
+    features = compute_features(audio, 22050, include=("rmse", "mfcc"))
+    assert set(features) == {"rmse", "mfcc"}
+    with pytest.raises(ValueError):
+        compute_features(audio, 22050, include=("tempo",))
+
+def test_blockwise_matches_one_shot(synthetic_tracks):
+    path = str(synthetic_tracks / "track1.wav")
+    audio, sr = librosa.load(path, sr=None)
+    one_shot = compute_features(audio, sr)
+    blockwise = extract_features_blockwise(path, block_frames=7)
+    for name, values in one_shot.items():
+        assert blockwise[name].shape == values.shape
+        assert np.allclose(blockwise[name], values, rtol=1e-5, atol=1e-5)
+
+def test_song_features_match_per_stem_features(synthetic_songs):
+    songs = load_songs(str(synthetic_songs))
+    stacked = extract_song_features(songs)
+    song = songs["song1"]
+    for row, stem in enumerate(song.stems):
+        single = compute_features(song.audio[row], song.sr)
+        for name, values in single.items():
+            np.testing.assert_allclose(stacked["song1"][name][row], values, rtol=1e-5, atol=1e-6)
+
+    parallel = dict(iter_song_features(str(synthetic_songs), include=("rmse",), n_jobs=2))
+    np.testing.assert_allclose(parallel["song0"]["rmse"], stacked["song0"]["rmse"], rtol=1e-6)
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from src.action_suggestion import feature_matrix
+from src.data_processing import AudioCatalog
+from src.feature_store import FeatureStore
+from src.model_training import build_training_matrix, prepare_data_for_training
+
+def make_features(names, offset=0.0):
+    return {name: {"spectral_centroid": i + offset, "rmse": 0.1 * i, "loudness": 2.0 * i}
+            for i, name in enumerate(names)}
+
+def test_append_supersede_and_compact(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    store.append(make_features(["a.wav", "b.wav"]))
+    # Column order comes from the schema, not from each dict's key order
+    store.append({"c.wav": {"loudness": 6.0, "rmse": 0.3, "spectral_centroid": 3.0}})
+    store.append(make_features(["a.wav"], offset=10.0))
+
+    reopened = FeatureStore(str(tmp_path / "store"))
+    assert reopened.columns == ("spectral_centroid", "rmse", "loudness")
+    assert reopened.filenames == ["b.wav", "c.wav", "a.wav"]
+    np.testing.assert_allclose(reopened.rows(["a.wav", "c.wav"]), [[10.0, 0.0, 0.0], [3.0, 0.3, 6.0]])
+
+    expected = np.array(reopened.matrix())
+    reopened.compact()
+    assert isinstance(reopened.matrix(), np.memmap)
+    np.testing.assert_array_equal(FeatureStore(str(tmp_path / "store")).matrix(), expected)
+
+    with pytest.raises(ValueError):
+        reopened.append({"d.wav": {"rmse": 1.0}})
+
+def test_compressed_round_trip(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    store.append(make_features(["a.wav", "b.wav", "c.wav"]))
+    store.export_compressed(str(tmp_path / "features.npz"))
+    copy = FeatureStore.import_compressed(str(tmp_path / "features.npz"), str(tmp_path / "copy"))
+    assert copy.filenames == store.filenames and copy.columns == store.columns
+    np.testing.assert_array_equal(copy.matrix(), store.matrix())
+
+def test_store_feeds_training_and_prediction(tmp_path):
+    features = make_features(["a.wav", "b.wav", "c.wav"])
+    store = FeatureStore(str(tmp_path / "store"))
+    store.append(features)
+    metadata = {name: (None, {"effects": i % 2}) for i, name in enumerate(features)}
+
+    X, y = prepare_data_for_training(store, metadata)
+    X_dict, y_dict = prepare_data_for_training(features, metadata)
+    np.testing.assert_allclose(X, X_dict, rtol=1e-6)
+    assert y == y_dict
+    assert feature_matrix(store)[0] == list(features)
+
+    X_train, y_train = build_training_matrix(store, {"a.wav": 0, "c.wav": 1})
+    np.testing.assert_allclose(X_train, X_dict[[0, 2]], rtol=1e-6)
+    assert list(y_train) == [0, 1]
+
+def test_update_from_audio_refreshes_changed_files_within_budget(tmp_path, synthetic_tracks, monkeypatch):
+    import src.feature_extraction as fe
+    directory = str(synthetic_tracks)
+    track_bytes = AudioCatalog(directory)["track0.wav"].audio.nbytes
+    catalog = AudioCatalog(directory, max_bytes=track_bytes)
+    extract = fe.extract_basic_features
+    held = []
+
+    def extract_one(audio_data, **kwargs):
+        assert len(audio_data) == 1
+        held.append(catalog.cached_bytes())
+        return extract(audio_data, **kwargs)
+
+    monkeypatch.setattr(fe, "extract_basic_features", extract_one)
+    store = FeatureStore(str(tmp_path / "store"))
+    assert store.update_from_audio(catalog, cache=False) == 3
+    assert max(held) <= track_bytes
+    assert FeatureStore(str(tmp_path / "store")).update_from_audio(catalog, cache=False) == 0
+
+    # A file re-recorded under the same name gets a fresh row
+    audio, sr = sf.read(os.path.join(directory, "track1.wav"))
+    sf.write(os.path.join(directory, "track1.wav"), audio[::-1] * 0.5, sr)
+    before = store.rows(["track1.wav"]).copy()
+    assert store.update_from_audio(AudioCatalog(directory), cache=False) == 1
+    assert not np.allclose(store.rows(["track1.wav"]), before)
+
+def test_training_skips_rows_of_deleted_files(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    store.append(make_features(["a.wav", "b.wav", "c.wav"]))
+    metadata = {"a.wav": (None, {"effects": 0}), "c.wav": (None, {"effects": 1})}
+    X, y = prepare_data_for_training(store, metadata)
+    np.testing.assert_allclose(X, store.rows(["a.wav", "c.wav"]))
+    assert y == [0, 1]
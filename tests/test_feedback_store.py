@@ -0,0 +1,54 @@
+import json
+from src import feedback_store
+from src.feedback import incorporate_feedback_into_training, save_feedback, load_feedback
+
+def make_feedback():
+    return [
+        {"track_name": "a.wav", "suggestion_type": "action", "effect": "EQ", "rating": 2},
+        {"track_name": "a.wav", "suggestion_type": "cut", "action": "Cut", "rating": 5},
+        {"track_name": "b.wav", "suggestion_type": "action", "effect": "Reverb", "rating": 3},
+    ]
+
+def test_save_and_load_feedback_store(tmp_path):
+    db_path = str(tmp_path / "feedback.db")
+    save_feedback(make_feedback(), db_path)
+    save_feedback(make_feedback()[:1], db_path)
+    assert len(load_feedback(db_path)) == 4
+    assert [e["rating"] for e in load_feedback(db_path, track_name="a.wav", suggestion_type="action")] == [2, 2]
+
+def test_track_ratings_are_aggregated(tmp_path):
+    db_path = str(tmp_path / "feedback.db")
+    feedback_store.insert_feedback(db_path, make_feedback(), batch_size=2)
+    ratings = feedback_store.track_ratings(db_path)
+    assert ratings["a.wav"] == {"count": 2, "mean_rating": 3.5, "penalty": 3}
+    assert ratings["b.wav"]["penalty"] == 2
+    assert feedback_store.track_ratings(db_path, suggestion_type="cut")["a.wav"]["penalty"] == 0
+
+def test_import_jsonl(tmp_path):
+    jsonl_path = tmp_path / "feedback.json"
+    jsonl_path.write_text("".join(json.dumps(e) + "\n" for e in make_feedback()))
+    db_path = str(tmp_path / "feedback.db")
+    assert feedback_store.import_jsonl(str(jsonl_path), db_path) == 3
+    assert load_feedback(db_path) == load_feedback(str(jsonl_path))
+
+def test_store_imports_legacy_jsonl_on_first_use(tmp_path):
+    (tmp_path / "feedback.json").write_text("".join(json.dumps(e) + "\n" for e in make_feedback()))
+    db_path = str(tmp_path / "feedback.db")
+    assert len(load_feedback(db_path)) == 3
+    save_feedback(make_feedback()[:1], db_path)
+    assert len(load_feedback(db_path)) == 4  # Imported once, not on every open
+
+def test_store_and_jsonl_adjust_labels_alike(tmp_path, monkeypatch):
+    import src.feedback
+    monkeypatch.setattr(src.feedback, "update_model", lambda model, features, labels, **kwargs: model)
+    feedback = make_feedback() + [{"track_name": "b.wav", "suggestion_type": "other", "rating": 1}]
+    jsonl_path = tmp_path / "legacy.jsonl"
+    jsonl_path.write_text("".join(json.dumps(e) + "\n" for e in feedback))
+    db_path = str(tmp_path / "store.db")
+    save_feedback(feedback, db_path)
+    adjusted = []
+    for path in (str(jsonl_path), db_path):
+        labels = {"a.wav": 5, "b.wav": 5}
+        incorporate_feedback_into_training({}, labels, path, model=object())
+        adjusted.append(labels)
+    assert adjusted[0] == adjusted[1] == {"a.wav": 2, "b.wav": 3}
@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from src.data_processing import load_audio_files
+from src.inference import get_model, to_jsonable
+from src.inference_server import MicroBatcher, make_handler
+
+def test_get_model_reloads_when_file_changes(tmp_path, make_rf_model):
+    model_path = str(tmp_path / "model.pkl")
+    make_rf_model(path=model_path)
+    first = get_model(model_path)
+    assert get_model(model_path) is first
+    make_rf_model(n_estimators=7, path=model_path)
+    os.utime(model_path, ns=(0, os.stat(model_path).st_mtime_ns + 10 ** 9))
+    reloaded = get_model(model_path)
+    assert reloaded is not first
+    assert reloaded.n_estimators == 7
+
+def test_micro_batcher_splits_results(tmp_path, synthetic_tracks, make_rf_model):
+    model_path = str(tmp_path / "model.pkl")
+    make_rf_model(path=model_path)
+    audio_data = load_audio_files(str(synthetic_tracks))
+    batcher = MicroBatcher(max_wait=0.05)
+    futures = [batcher.submit(model_path, {name: audio_data[name]}) for name in audio_data]
+    for name, future in zip(audio_data, futures):
+        actions, cuts = future.result(timeout=30)
+        assert list(actions) == [name] and list(cuts) == [name]
+        assert to_jsonable(actions)[name] in (0, 1)
+
+def test_server_refuses_models_outside_the_allowlist(tmp_path, make_rf_model):
+    model_path = str(tmp_path / "model.pkl")
+    make_rf_model(path=model_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(model_path, MicroBatcher()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+        for path, status in ((str(tmp_path / "other.pkl"), 403), (model_path, 200)):
+            body = json.dumps({"files": [], "model_path": path}).encode()
+            try:
+                code = urllib.request.urlopen(url, data=body, timeout=10).status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            assert code == status
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+import os
+import soundfile as sf
+from src.manifest import IngestionManifest, process_new_audio
+
+def test_process_new_audio_only_touches_changed_files(tmp_path, synthetic_tracks, make_rf_model):
+    directory, model_path = str(synthetic_tracks), str(tmp_path / "model.pkl")
+    make_rf_model(path=model_path)
+
+    # Freshly written files are left alone until they have settled
+    assert process_new_audio(directory, model_path)[2] == []
+
+    actions, cuts, processed = process_new_audio(directory, model_path, settle=0)
+    assert processed == ["track0.wav", "track1.wav", "track2.wav"]
+    assert set(actions) == set(cuts) == set(processed)
+
+    again, _, processed = process_new_audio(directory, model_path, settle=0)
+    assert processed == [] and again == actions
+
+    # A touched file is recognised by its hash; rewritten content is processed again
+    track0 = os.path.join(directory, "track0.wav")
+    os.utime(track0, ns=(0, os.stat(track0).st_mtime_ns + 10 ** 9))
+    audio, sr = sf.read(os.path.join(directory, "track1.wav"))
+    sf.write(os.path.join(directory, "track1.wav"), audio[::-1], sr)
+    os.remove(os.path.join(directory, "track2.wav"))
+    actions, _, processed = process_new_audio(directory, model_path, settle=0)
+    assert processed == ["track1.wav"]
+    assert set(actions) == {"track0.wav", "track1.wav"}
+
+    # A different model invalidates every stored result
+    make_rf_model(n_estimators=7, path=model_path)
+    _, _, processed = process_new_audio(directory, model_path, settle=0)
+    assert processed == ["track0.wav", "track1.wav"]
+
+def test_explicit_version_keeps_results_across_retrains(tmp_path, synthetic_tracks, make_rf_model):
+    directory, model_path = str(synthetic_tracks), str(tmp_path / "model.pkl")
+    make_rf_model(path=model_path)
+    process_new_audio(directory, model_path, settle=0, version="v1")
+
+    make_rf_model(n_estimators=7, path=model_path)
+    assert process_new_audio(directory, model_path, settle=0, version="v1")[2] == []
+    assert len(process_new_audio(directory, model_path, settle=0, version="v2")[2]) == 3
+
+def test_manifest_records_the_state_files_were_scanned_in(tmp_path, synthetic_tracks):
+    directory = str(synthetic_tracks)
+    manifest = IngestionManifest(str(tmp_path / "manifest.db"))
+    pending, _ = manifest.scan(directory, "v1", settle=0)
+    # track0 finishes copying in after it was scanned and analysed
+    with open(os.path.join(directory, "track0.wav"), 'ab') as f:
+        f.write(b"\0" * 64)
+    manifest.record({f: {} for f in pending}, "v1", pending)
+    pending, cached = manifest.scan(directory, "v1", settle=0)
+    manifest.close()
+    assert list(pending) == ["track0.wav"]
+    assert sorted(cached) == ["track1.wav", "track2.wav"]
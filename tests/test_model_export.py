@@ -0,0 +1,84 @@
+import numpy as np
+from sklearn import ensemble
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.svm import SVC
+from src.inference import load_model
+from src.model_export import CompactModel, export_model
+
+def make_data(n_classes, n=150, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((n, 4))
+    return X, (X[:, 0] * n_classes).astype(int), rng.random((40, 4))
+
+def test_export_matches_soft_voting_ensemble(tmp_path):
+    for n_classes in (2, 3):
+        X, y, X_test = make_data(n_classes)
+        model = ensemble.VotingClassifier([
+            ("rf", RandomForestClassifier(n_estimators=10, random_state=0)),
+            ("svm", SVC(probability=True, random_state=0)),
+        ], voting="soft").fit(X, y)
+        compact = CompactModel(export_model(model, str(tmp_path / f"model{n_classes}")))
+        np.testing.assert_allclose(compact.predict_proba(X_test), model.predict_proba(X_test), atol=1e-10)
+        np.testing.assert_array_equal(compact.predict(X_test), model.predict(X_test))
+
+def test_export_plain_forest_with_string_labels(tmp_path):
+    X, y, X_test = make_data(3)
+    labels = np.array(["cut", "fade", "keep"])[y]
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, labels)
+    export_model(model, str(tmp_path / "rf"))
+    compact = load_model(str(tmp_path / "rf"))
+    assert isinstance(compact, CompactModel)
+    np.testing.assert_array_equal(compact.predict(X_test), model.predict(X_test))
+
+class FakeLayer:
+    def __init__(self, config, weights=()):
+        self.config, self.weights = config, list(weights)
+
+    def get_config(self):
+        return self.config
+
+    def get_weights(self):
+        return self.weights
+
+def layer(kind, config, weights=()):
+    """Builds a stand-in Keras layer whose class name is ``kind``."""
+    return type(kind, (FakeLayer,), {})(config, weights)
+
+class FakeKerasClassifier:
+    build_fn = None
+    classes_ = np.array([0, 1])
+
+    def __init__(self, layers):
+        self.model = type("Model", (), {"layers": layers})()
+
+class VotingClassifier:
+    """Minimal fitted soft-voting ensemble around a single member."""
+
+    voting = "soft"
+    weights = None
+    classes_ = np.array([0, 1])
+
+    def __init__(self, name, member):
+        self.named_estimators_ = {name: member}
+        self.estimators_ = [member]
+
+def test_export_keras_forward_pass(tmp_path):
+    rng = np.random.default_rng(0)
+    conv_w, conv_b = rng.normal(size=(3, 1, 4)), rng.normal(size=4)
+    dense_w, dense_b = rng.normal(size=(12, 1)), rng.normal(size=1)
+    cnn = FakeKerasClassifier([
+        layer("Reshape", {"target_shape": (8, 1)}),
+        layer("Conv1D", {"activation": "relu", "padding": "valid", "strides": (1,),
+                         "dilation_rate": (1,)}, [conv_w, conv_b]),
+        layer("MaxPooling1D", {"padding": "valid", "pool_size": (2,), "strides": (2,)}),
+        layer("Flatten", {}),
+        layer("Dropout", {}),
+        layer("Dense", {"activation": "sigmoid"}, [dense_w, dense_b]),
+    ])
+    X = rng.normal(size=(5, 8))
+    compact = CompactModel(export_model(VotingClassifier("cnn", cnn), str(tmp_path / "cnn")))
+
+    conv = np.stack([np.maximum(X[:, t:t + 3] @ conv_w[:, 0, :] + conv_b, 0) for t in range(6)], axis=1)
+    pooled = np.maximum(conv[:, 0::2], conv[:, 1::2]).reshape(5, -1)
+    p = 1 / (1 + np.exp(-(pooled @ dense_w + dense_b)))
+    np.testing.assert_allclose(compact.predict_proba(X), np.hstack([1 - p, p]), rtol=1e-4)
@@ -1,5 +1,9 @@
 import pytest
-from src.model_training import train_model
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.model_selection import GridSearchCV
+from sklearn.svm import SVC
+from src.model_training import train_model, update_model, detect_drift, build_training_matrix, search_ensemble
 from src.feature_extraction import extract_mfcc
 from src.data_processing import load_audio_files
 
@@ -11,3 +15,89 @@ def test_train_model():
     model = train_model(features, labels)
     assert model is not None
     assert hasattr(model, "predict")
+
+def make_frame_features(n_tracks=6, n_frames=10):
+    rng = np.random.default_rng(0)
+    feature_data = {f"track{i}.wav": rng.random((4, n_frames)) + (i % 2) for i in range(n_tracks)}
+    labels = {filename: i % 2 for i, filename in enumerate(feature_data)}
+    return feature_data, labels
+
+def test_update_model_warm_starts_forest():
+    feature_data, labels = make_frame_features()
+    X, y = build_training_matrix(feature_data, labels)
+    model = VotingClassifier([("rf", RandomForestClassifier(n_estimators=10, random_state=0))],
+                             voting="soft").fit(X, y)
+    first_trees = list(model.named_estimators_["rf"].estimators_)
+    updated = update_model(model, feature_data, labels, extra_trees=5)
+    trees = updated.named_estimators_["rf"].estimators_
+    assert len(trees) == 15
+    assert trees[:10] == first_trees
+
+def test_detect_drift_on_unseen_labels():
+    feature_data, labels = make_frame_features()
+    X, y = build_training_matrix(feature_data, labels)
+    model = VotingClassifier([("rf", RandomForestClassifier(n_estimators=10, random_state=0))],
+                             voting="soft").fit(X, y)
+    assert not detect_drift(model, X, y)
+    assert detect_drift(model, X, y - 3)
+
+def test_single_feedback_adjustment_updates_incrementally(monkeypatch):
+    import src.model_training as mt
+    feature_data, labels = make_frame_features()
+    X, y = build_training_matrix(feature_data, labels)
+    model = VotingClassifier([("rf", RandomForestClassifier(n_estimators=10, random_state=0))],
+                             voting="soft").fit(X, y)
+    labels["track0.wav"] -= 2  # A poor rating moves one track to a label the model has never seen
+    X, y = build_training_matrix(feature_data, labels)
+    assert not detect_drift(model, X, y)
+    monkeypatch.setattr(mt, "train_model", lambda *args, **kwargs: pytest.fail("full retraining"))
+    updated = update_model(model, feature_data, labels, extra_trees=5)
+    assert len(updated.named_estimators_["rf"].estimators_) == 15
+
+def test_update_model_retrains_when_a_class_disappears(monkeypatch):
+    import src.model_training as mt
+    feature_data, _ = make_frame_features(n_tracks=10)
+    labels = {filename: int(i == 0) for i, filename in enumerate(feature_data)}
+    X, y = build_training_matrix(feature_data, labels)
+    model = VotingClassifier([("rf", RandomForestClassifier(n_estimators=10, random_state=0)),
+                              ("svm", SVC(probability=True, random_state=0))], voting="soft").fit(X, y)
+    labels["track0.wav"] -= 2  # The only track of class 1 gets a poor rating
+    retrained = []
+    monkeypatch.setattr(mt, "train_model", lambda *args, **kwargs: retrained.append(args) or "retrained")
+    assert update_model(model, feature_data, labels, extra_trees=5) == "retrained"
+    assert len(retrained) == 1
+
+def test_build_training_matrix_is_float32_memmap(tmp_path):
+    feature_data, labels = make_frame_features(n_tracks=4, n_frames=10)
+    X, y = build_training_matrix(feature_data, labels, path=str(tmp_path / "X.npy"))
+    assert isinstance(X, np.memmap) and X.dtype == np.float32
+    assert X.shape == (40, 4)
+    assert np.allclose(X[10:20], feature_data["track1.wav"].T)
+    assert y[10:20].tolist() == [1] * 10
+
+def test_build_training_matrix_subsamples():
+    feature_data, labels = make_frame_features(n_tracks=4, n_frames=10)
+    X, y = build_training_matrix(feature_data, labels, max_frames_per_track=6, random_state=0)
+    assert X.shape == (24, 4)
+    X, y = build_training_matrix(feature_data, labels, max_frames_per_label=8, random_state=0)
+    assert X.shape == (16, 4)
+    assert (y == 0).sum() == (y == 1).sum() == 8
+
+@pytest.mark.parametrize("weights", [None, [1, 3]])
+def test_search_ensemble_matches_grid_search(weights):
+    rng = np.random.default_rng(0)
+    X = rng.random((150, 4))
+    y = (X[:, 0] + 0.3 * rng.random(150) > 0.6).astype(int)
+    ensemble = VotingClassifier([("rf", RandomForestClassifier(n_estimators=10, random_state=0)),
+                                 ("svm", SVC(probability=True, random_state=0))], voting="soft",
+                                weights=weights)
+    param_grid = {"rf__n_estimators": [5, 10], "svm__C": [0.1, 10]}
+    best_params, best_score = search_ensemble(ensemble, param_grid, X, y, n_jobs=1)
+    grid = GridSearchCV(ensemble, param_grid, cv=3).fit(X, y)
+    assert best_params == grid.best_params_
+    assert best_score == pytest.approx(grid.best_score_)
+
+def test_search_ensemble_rejects_hard_voting():
+    ensemble = VotingClassifier([("rf", RandomForestClassifier(n_estimators=5))], voting="hard")
+    with pytest.raises(ValueError, match="soft voting"):
+        search_ensemble(ensemble, {"rf__n_estimators": [5]}, np.zeros((9, 2)), np.arange(9) % 2, n_jobs=1)
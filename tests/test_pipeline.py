@@ -0,0 +1,20 @@
+import threading
+from src.data_processing import load_audio_files
+from src.inference import predict_actions
+from src.pipeline import iter_pipelined, run_pipelined_inference
+
+def test_pipelined_matches_staged_inference(tmp_path, synthetic_tracks, make_rf_model):
+    model_path = str(tmp_path / "model.pkl")
+    model = make_rf_model(path=model_path)
+    expected_actions, expected_cuts = predict_actions(model, load_audio_files(str(synthetic_tracks)))
+    actions, cuts = run_pipelined_inference(model_path, str(synthetic_tracks), n_extractors=2,
+                                            batch_size=2, queue_size=1, cache=False)
+    assert actions == expected_actions
+    assert cuts == expected_cuts
+
+def test_pipelined_stops_workers_when_abandoned(synthetic_tracks, make_rf_model):
+    before = threading.active_count()
+    stream = iter_pipelined(str(synthetic_tracks), make_rf_model(), batch_size=1, queue_size=1, cache=False)
+    next(stream)
+    stream.close()
+    assert threading.active_count() == before
@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pytest
+from src import profiling
+from src.data_processing import load_audio_files
+
+@pytest.fixture
+def profiler():
+    profiling.reset()
+    profiling.enable()
+    yield profiling
+    profiling.disable()
+    profiling.reset()
+
+def test_span_is_noop_when_disabled():
+    profiling.disable()
+    profiling.reset()
+    with profiling.span("stage"):
+        pass
+    assert profiling.summary() == {}
+
+def test_spans_record_time_and_memory(profiler, tmp_path):
+    with profiler.span("outer"):
+        with profiler.span("inner", track="a.wav"):
+            buffer = np.ones(1_000_000)
+        del buffer
+    stats = profiler.summary()
+    assert stats["inner"]["count"] == 1
+    assert stats["inner"]["slowest"] == {"track": "a.wav"}
+    assert stats["inner"]["max_peak_bytes"] >= 8_000_000
+    assert stats["outer"]["max_peak_bytes"] >= stats["inner"]["max_peak_bytes"]
+
+    trace_path = tmp_path / "trace.json"
+    profiler.write_chrome_trace(str(trace_path))
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    assert {event["name"] for event in events} == {"outer", "inner"}
+    assert all(event["ph"] == "X" for event in events)
+
+def test_profiled_decorator(profiler):
+    @profiler.profiled("work")
+    def work(x):
+        return x * 2
+
+    assert work(3) == 6
+    assert profiler.summary()["work"]["count"] == 1
+
+def test_spans_without_reset_peak(profiler, monkeypatch):
+    monkeypatch.setattr(profiling, "_HAS_RESET_PEAK", False)
+    with profiler.span("outer"):
+        with profiler.span("inner"):
+            buffer = np.ones(1_000_000)
+        del buffer
+    stats = profiler.summary()
+    assert stats["inner"]["max_peak_bytes"] >= 8_000_000
+    assert stats["outer"]["max_peak_bytes"] >= stats["inner"]["max_peak_bytes"]
+
+def test_worker_process_spans_reach_the_parent(profiler, synthetic_tracks):
+    profiler.disable()
+    profiler.enable(memory=False)  # Tracing every allocation makes the workers' imports slow
+    audio_data = load_audio_files(str(synthetic_tracks), n_jobs=2)
+    decodes = profiler.summary()["decode"]
+    assert decodes["count"] == len(audio_data)
+    assert decodes["slowest"]["track"] in audio_data